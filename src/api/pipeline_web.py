@@ -1,21 +1,37 @@
 """
 Este módulo define um serviço web Flask que executa um pipeline ETL em background.
 Ele configura o ambiente de logging, a conexão com o banco de dados PostgreSQL e inicia o pipeline
-em uma thread separada. O serviço expõe um endpoint `/health-pipeline` para verificar a saúde do serviço.
+em uma thread separada. O serviço expõe os endpoints:
+
+- `/health-pipeline`: verifica a saúde do serviço;
+- `/stream`: envia as novas cotações via Server-Sent Events;
+- `/statistics`: estatísticas das cotações em janelas deslizantes;
+- `/sources`: latência e falhas de cada fonte de cotação;
+- `/profile-pipeline`: captura um perfil de CPU da thread do pipeline sob demanda.
 """
 
+import hmac
+import json
 import os
+import queue
+import sys
 import threading
+import time
+from collections import Counter
 
-from flask import Flask, jsonify
+from flask import Flask, Response, abort, jsonify, request, stream_with_context
 
+from src.config.config import PROFILING_TOKEN
 from src.database.database import Base
 from src.main import (
     configure_ambient_logging,
     configure_database,
     create_tables,
     loop_pipeline,
+    rolling_statistics,
 )
+from src.pipeline.events import quote_broker
+from src.pipeline.extract import quote_extractor
 
 app = Flask(__name__)
 
@@ -23,7 +39,9 @@ app = Flask(__name__)
 logger = configure_ambient_logging()
 engine, Session = configure_database()
 create_tables(engine, logger)
-pipeline_thread = threading.Thread(target=loop_pipeline, args=(Session, logger))
+pipeline_thread = threading.Thread(
+    target=loop_pipeline, args=(Session, logger), name="pipeline"
+)
 pipeline_thread.start()
 
 
@@ -40,6 +58,199 @@ def health_pipeline():
     return jsonify({"status": "ok"})
 
 
+@app.route("/stream")
+def stream():
+    """
+    Endpoint de Server-Sent Events com as novas cotações salvas pelo pipeline.
+
+    Cada lote inserido gera um evento `cotacao` cujo `data` é uma lista JSON de cotações.
+    Um comentário de keep-alive é enviado a cada 15 segundos sem novas cotações. Cada
+    conexão ocupa uma thread do servidor, então o Gunicorn deve usar workers com threads
+    (ex: `--threads 8`).
+
+    Returns
+    -------
+    flask.Response
+        Stream `text/event-stream` de cotações.
+    """
+
+    def events():
+        subscription = quote_broker.subscribe()
+        try:
+            while True:
+                try:
+                    cotacoes = subscription.get(timeout=15)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: cotacao\ndata: {json.dumps(cotacoes)}\n\n"
+        finally:
+            quote_broker.unsubscribe(subscription)
+
+    return Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.route("/statistics")
+def statistics():
+    """
+    Endpoint com as estatísticas das cotações em janelas deslizantes.
+
+    As estatísticas são mantidas em memória pelo pipeline, então a consulta tem custo
+    constante e não acessa o banco. O parâmetro opcional `par` (ex: ``USD-BRL``) filtra
+    um par de moedas e `janela` (ex: ``hora``, ``dia``, ``hoje``) filtra uma janela.
+
+    Returns
+    -------
+    dict
+        Estatísticas por par e por janela em formato JSON.
+    """
+    janela = request.args.get("janela")
+    if janela is not None and janela not in rolling_statistics.janelas:
+        return jsonify({"status": "error", "detail": f"janela inválida: {janela}"}), 400
+    par = request.args.get("par")
+    pares = rolling_statistics.pairs()
+    if par is not None:
+        pares = [p for p in pares if "-".join(p) == par.upper()]
+    result = {}
+    for origem, destino in pares:
+        if janela is None:
+            result[f"{origem}-{destino}"] = rolling_statistics.get_all(origem, destino)
+        else:
+            result[f"{origem}-{destino}"] = {
+                janela: rolling_statistics.get(origem, destino, janela)
+            }
+    return jsonify(result)
+
+
+@app.route("/sources")
+def sources():
+    """
+    Endpoint com as estatísticas de latência e falhas de cada fonte de cotação.
+
+    Returns
+    -------
+    dict
+        Percentis de latência (segundos) e taxa de falhas por fonte, em formato JSON.
+    """
+    return jsonify(quote_extractor.stats())
+
+
+# Threads de trabalho do pipeline: requisições às fontes de cotação e backfill
+PROFILED_THREAD_PREFIXES = ("quote-source", "backfill")
+
+# Folhas (arquivo, função) de threads paradas à espera de trabalho ou de um evento
+IDLE_LEAVES = {
+    ("threading.py", "wait"),
+    ("thread.py", "_worker"),
+    ("selectors.py", "select"),
+}
+
+
+def pipeline_threads(main_thread):
+    """
+    Lista as threads do pipeline: a thread principal e as suas threads de trabalho.
+
+    Parameters
+    ----------
+    main_thread : threading.Thread
+        Thread que executa `loop_pipeline`.
+
+    Returns
+    -------
+    list of threading.Thread
+        A thread principal e as threads cujo nome começa com um dos
+        `PROFILED_THREAD_PREFIXES` (fontes de cotação e backfill).
+    """
+    return [
+        thread
+        for thread in threading.enumerate()
+        if thread is main_thread or thread.name.startswith(PROFILED_THREAD_PREFIXES)
+    ]
+
+
+def sample_thread_stacks(main_thread, seconds, interval=0.005):
+    """
+    Amostra periodicamente as pilhas de execução das threads do pipeline.
+
+    O perfil é obtido por amostragem via `sys._current_frames`, sem instrumentar as
+    threads alvo: o custo fica na thread que atende a requisição e é nulo fora da
+    captura. As threads são listadas a cada amostra (ver `pipeline_threads`), pois as
+    do backfill e das fontes vêm e vão. Amostras de threads ociosas (folha em
+    `IDLE_LEAVES`) são descartadas, para que o perfil mostre onde o pipeline trabalha
+    ou espera por I/O, e não o tempo parado entre os ciclos.
+
+    Parameters
+    ----------
+    main_thread : threading.Thread
+        Thread que executa `loop_pipeline`.
+    seconds : float
+        Duração da captura em segundos.
+    interval : float, optional
+        Intervalo entre amostras em segundos, by default 0.005.
+
+    Returns
+    -------
+    collections.Counter
+        Contagem de amostras por pilha, no formato "collapsed stacks" (nome da thread
+        seguido de `arquivo:funcao:linha`, separados por `;`, da raiz para a folha).
+    """
+    stacks = Counter()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline and main_thread.is_alive():
+        current_frames = sys._current_frames()
+        for thread in pipeline_threads(main_thread):
+            frame = current_frames.get(thread.ident)
+            if frame is None:
+                continue
+            leaf = (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name)
+            if leaf in IDLE_LEAVES:
+                continue
+            frames = []
+            while frame is not None:
+                code = frame.f_code
+                frames.append(
+                    f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}"
+                )
+                frame = frame.f_back
+            frames.append(thread.name.split("_")[0])
+            stacks[";".join(reversed(frames))] += 1
+        time.sleep(interval)
+    return stacks
+
+
+@app.route("/profile-pipeline")
+def profile_pipeline():
+    """
+    Endpoint de controle que captura um perfil das threads do pipeline.
+
+    Exige o cabeçalho `X-Profiling-Token` igual à variável de ambiente
+    `PROFILING_TOKEN`; sem ela configurada o endpoint fica desabilitado. O token não é
+    aceito na URL, para não aparecer nos logs de acesso. O parâmetro opcional `seconds` define a
+    duração da captura (padrão 10, máximo 60 segundos).
+
+    Returns
+    -------
+    flask.Response
+        Pilhas amostradas em texto ("collapsed stacks", compatível com flamegraph.pl
+        e speedscope), uma por linha seguida do número de amostras.
+    """
+    token = request.headers.get("X-Profiling-Token", "")
+    if not PROFILING_TOKEN or not hmac.compare_digest(
+        token.encode(), PROFILING_TOKEN.encode()
+    ):
+        abort(404)
+    seconds = min(max(request.args.get("seconds", 10, type=float), 0.1), 60)
+    if not pipeline_thread.is_alive():
+        return jsonify({"status": "error", "detail": "pipeline parado"}), 503
+    stacks = sample_thread_stacks(pipeline_thread, seconds)
+    body = "\n".join(f"{stack} {count}" for stack, count in stacks.most_common())
+    return Response(body + "\n", mimetype="text/plain")
+
+
 if __name__ == "__main__":
     # Este bloco permite rodar o pipeline ETL no Render, expondo um endpoint Flask para health
     # check.
@@ -6,6 +6,9 @@ para o logger e a conexão com o banco de dados.
 
 import logging
 import os
+import random
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
 from logging import basicConfig, getLogger
 
 import logfire
@@ -22,6 +25,48 @@ POSTGRES_HOST = os.getenv("POSTGRES_HOST")
 POSTGRES_PORT = os.getenv("POSTGRES_PORT")
 POSTGRES_DB = os.getenv("POSTGRES_DB")
 
+# Nível de instrumentação do logfire: "off", "sampled" ou "full"
+INSTRUMENTATION_LEVELS = ("off", "sampled", "full")
+INSTRUMENTATION_LEVEL = os.getenv("INSTRUMENTATION_LEVEL", "full").lower()
+if INSTRUMENTATION_LEVEL not in INSTRUMENTATION_LEVELS:
+    raise ValueError(
+        f"INSTRUMENTATION_LEVEL inválido: {INSTRUMENTATION_LEVEL} "
+        f"(use {', '.join(INSTRUMENTATION_LEVELS)})"
+    )
+INSTRUMENTATION_SAMPLE_RATE = float(os.getenv("INSTRUMENTATION_SAMPLE_RATE", "0.1"))
+# Cota do plano da AwesomeAPI e circuit breaker das requisições
+RATE_LIMIT_PER_MINUTE = float(os.getenv("RATE_LIMIT_PER_MINUTE", "30"))
+RATE_LIMIT_BURST = int(os.getenv("RATE_LIMIT_BURST", "5"))
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_OPEN_SECONDS = float(os.getenv("CIRCUIT_OPEN_SECONDS", "60"))
+# Fontes de cotação (awesomeapi, URL base compatível ou local:<caminho>) e hedge
+QUOTE_SOURCES = os.getenv("QUOTE_SOURCES", "awesomeapi").split(",")
+# Tokens das fontes configuradas por URL ("<url>=<token>" separados por vírgula); essas
+# fontes são outros provedores e nunca recebem o TOKEN_AWESOMEAPI
+QUOTE_SOURCE_TOKENS = dict(
+    item.strip().split("=", 1)
+    for item in os.getenv("QUOTE_SOURCE_TOKENS", "").split(",")
+    if "=" in item
+)
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "95"))
+# Detecção de lacunas e backfill
+BACKFILL_MAX_GAP_MINUTES = int(os.getenv("BACKFILL_MAX_GAP_MINUTES", "5"))
+BACKFILL_LOOKBACK_DAYS = int(os.getenv("BACKFILL_LOOKBACK_DAYS", "7"))
+BACKFILL_WORKERS = int(os.getenv("BACKFILL_WORKERS", "4"))
+BACKFILL_RETRY_MINUTES = int(os.getenv("BACKFILL_RETRY_MINUTES", "5"))
+# Retenção e compactação das cotações brutas
+RAW_RETENTION_DAYS = int(os.getenv("RAW_RETENTION_DAYS", "30"))
+COMPACTION_RESOLUTION = os.getenv("COMPACTION_RESOLUTION", "minute").lower()
+COMPACTION_BATCH_SIZE = int(os.getenv("COMPACTION_BATCH_SIZE", "5000"))
+if BACKFILL_LOOKBACK_DAYS > RAW_RETENTION_DAYS:
+    # Períodos já compactados não têm cotações brutas e pareceriam lacunas
+    raise ValueError(
+        f"BACKFILL_LOOKBACK_DAYS ({BACKFILL_LOOKBACK_DAYS}) não pode ser maior que "
+        f"RAW_RETENTION_DAYS ({RAW_RETENTION_DAYS})"
+    )
+# Token exigido pelo endpoint de profiling; sem ele o endpoint fica desabilitado
+PROFILING_TOKEN = os.getenv("PROFILING_TOKEN")
+
 
 def configure_ambient_logging():
     """
@@ -29,6 +74,12 @@ def configure_ambient_logging():
     Carrega as variáveis de ambiente necessárias e define o logger para registrar logs no console e
     no logfire.
 
+    O custo da telemetria é controlado por `INSTRUMENTATION_LEVEL`:
+
+    - ``off``: nenhum span é aberto e `requests`/SQLAlchemy não são instrumentados;
+    - ``sampled``: apenas uma fração (`INSTRUMENTATION_SAMPLE_RATE`) dos ciclos é rastreada;
+    - ``full``: todos os ciclos e chamadas externas são rastreados (padrão).
+
     Returns
     -------
     logger : logging.Logger
@@ -38,12 +89,84 @@ def configure_ambient_logging():
     basicConfig(handlers=[logfire.LogfireLoggingHandler()])
     logger = getLogger(__name__)
     logger.setLevel(logging.INFO)
-    logfire.instrument_requests()
-    logfire.instrument_sqlalchemy()
+    if INSTRUMENTATION_LEVEL != "off":
+        logfire.instrument_requests()
+        logfire.instrument_sqlalchemy()
 
     return logger
 
 
+def should_trace_cycle():
+    """
+    Decide se o ciclo atual do pipeline deve ser rastreado com spans.
+
+    Returns
+    -------
+    bool
+        False quando a instrumentação está desligada; no modo ``sampled``, True
+        com probabilidade `INSTRUMENTATION_SAMPLE_RATE`; True no modo ``full``.
+    """
+    if INSTRUMENTATION_LEVEL == "off":
+        return False
+    if INSTRUMENTATION_LEVEL == "sampled":
+        return random.random() < INSTRUMENTATION_SAMPLE_RATE
+    return True
+
+
+# Indica se o ciclo em execução é rastreado; lido por `io_instrumentation`
+_cycle_traced = ContextVar("cycle_traced", default=True)
+
+
+@contextmanager
+def span(name, enabled=True):
+    """
+    Abre um span do logfire apenas quando a instrumentação está habilitada.
+
+    Também marca, para o contexto atual, se o ciclo é rastreado. No modo ``sampled``,
+    as chamadas HTTP e ao banco de um ciclo não amostrado envolvidas por
+    `io_instrumentation` não geram spans automáticos; os logs continuam sendo enviados.
+
+    Parameters
+    ----------
+    name : str
+        Nome do span.
+    enabled : bool, optional
+        Se False, nenhum span é aberto e não há custo de telemetria, by default True.
+
+    Yields
+    ------
+    None
+    """
+    traced = enabled and INSTRUMENTATION_LEVEL != "off"
+    token = _cycle_traced.set(traced)
+    try:
+        if traced:
+            with logfire.span(name):
+                yield
+        else:
+            yield
+    finally:
+        _cycle_traced.reset(token)
+
+
+def io_instrumentation():
+    """
+    Contexto para chamadas HTTP e ao banco feitas durante um ciclo do pipeline.
+
+    Em um ciclo não amostrado do modo ``sampled``, suprime os spans automáticos de
+    `requests` e SQLAlchemy. Como a supressão também descarta os logs emitidos dentro
+    dela, o bloco deve conter apenas a chamada externa, nunca chamadas ao logger.
+
+    Returns
+    -------
+    contextlib.AbstractContextManager
+        O supressor de instrumentação do logfire ou um `contextlib.nullcontext`.
+    """
+    if INSTRUMENTATION_LEVEL == "sampled" and not _cycle_traced.get():
+        return logfire.suppress_instrumentation()
+    return nullcontext()
+
+
 def configure_database():
     """
     Configura a conexão com o banco de dados PostgreSQL usando SQLAlchemy. Carrega as variáveis de
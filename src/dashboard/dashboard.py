@@ -1,16 +1,30 @@
 """
 Módulo responsável pelo dashboard Streamlit para visualização dos dados do dólar.
+
+O histórico é lido do banco uma única vez por sessão; depois disso, apenas as cotações
+novas são buscadas e anexadas, quando o pipeline as anuncia via `NOTIFY`. Se o anúncio
+trouxer cotações anteriores às já exibidas (backfill), o trecho a partir delas é relido.
 """
 
 import datetime
+import json
 import os
+import select
+import threading
+import time
+from collections import deque
 
 import pandas as pd
+import psycopg2
+import psycopg2.extensions
 import streamlit as st
 from dotenv import load_dotenv
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
 
 from src.database.database import DolarData
+from src.pipeline.events import NOTIFY_CHANNEL
+from src.pipeline.statistics import RollingStatistics, to_sao_paulo
 
 load_dotenv()
 
@@ -25,15 +39,23 @@ DATABASE_URL = (
     f"@{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}"
 )
 engine = create_engine(DATABASE_URL)
+Session = sessionmaker(bind=engine)
 
 
-def read_data_from_db():
+def read_data_from_db(desde=None):
     """
     Lê os dados do dólar armazenados no banco de dados PostgreSQL.
     Conecta ao banco de dados e executa uma consulta SQL para obter os dados mais recentes
     sobre a cotação do dólar, incluindo moeda de origem, moeda de destino, valor de compra
     e timestamp da cotação.
 
+    Parameters
+    ----------
+    desde : datetime.datetime, optional
+        Se informado (horário de São Paulo, sem timezone), lê apenas as cotações a
+        partir deste instante, inclusive. Se omitido, inclui também o histórico
+        compactado em dolar_data_barras, by default None.
+
     Returns
     -------
     pd.DataFrame
@@ -52,22 +74,266 @@ def read_data_from_db():
         erro no Streamlit.
     """
     try:
-        query = """
+        params = {}
+        if desde is not None:
+            complemento = (
+                "WHERE dolar_data.timestamp_moeda >= "
+                "CAST(:desde AS timestamp) AT TIME ZONE 'America/Sao_Paulo'"
+            )
+            params["desde"] = desde
+        else:
+            # Histórico compactado: uma linha por barra, com o valor de fechamento
+            complemento = """
+        UNION ALL
+        SELECT
+            moeda_origem,
+            moeda_destino,
+            fechamento AS valor_de_compra,
+            inicio AT TIME ZONE 'America/Sao_Paulo' AS timestamp_moeda
+        FROM dolar_data_barras
+            """
+        query = f"""
         SELECT
             moeda_origem,
             moeda_destino,
             valor_de_compra,
 			timestamp_moeda AT TIME ZONE 'America/Sao_Paulo' AS timestamp_moeda
 		FROM dolar_data 
+        {complemento}
         ORDER BY timestamp_moeda DESC
         """
-        df = pd.read_sql(query, engine)
+        df = pd.read_sql(text(query), engine, params=params)
         return df
     except Exception as e:
         st.error(f"Erro ao conectar ao banco de dados: {e}")
         return pd.DataFrame()
 
 
+def load_data():
+    """
+    Retorna os dados do dólar da sessão, buscando no banco apenas as cotações novas.
+
+    Na primeira execução da sessão, lê todo o histórico; nas seguintes, relê apenas o
+    trecho a partir da cotação mais recente do DataFrame em `st.session_state`, ou a
+    partir da cotação mais antiga anunciada pelo `QuoteListener` desde a última leitura,
+    se o backfill tiver inserido cotações anteriores às já exibidas.
+
+    Returns
+    -------
+    pd.DataFrame
+        DataFrame com as cotações, da mais recente para a mais antiga.
+    """
+    listener = get_quote_listener()
+    versao = listener.versao
+    df = st.session_state.get("dados")
+    if df is None or df.empty:
+        df = read_data_from_db()
+    else:
+        timestamps = pd.to_datetime(df["timestamp_moeda"])
+        desde = timestamps.max().to_pydatetime()
+        if versao != st.session_state.versao_dados:
+            inicio = listener.oldest_since(st.session_state.versao_dados)
+            desde = None if inicio is None else min(desde, inicio)
+        if desde is None:
+            # Notificações perdidas: não há como saber o trecho alterado
+            df = read_data_from_db()
+        else:
+            novos = read_data_from_db(desde=desde)
+            df = pd.concat([novos, df[timestamps < desde]], ignore_index=True)
+    st.session_state.dados = df
+    st.session_state.versao_dados = versao
+    return df
+
+
+class QuoteListener:
+    """Escuta o canal `NOTIFY_CHANNEL` do PostgreSQL em uma thread de background.
+
+    Uma única conexão é compartilhada por todas as sessões do dashboard; cada
+    notificação incrementa `versao`, que as sessões comparam com a última versão vista.
+    O `timestamp_inicial` das últimas notificações é guardado para que as sessões
+    saibam a partir de quando reler os dados (ver `oldest_since`).
+
+    Parameters
+    ----------
+    dsn : str
+        URL de conexão com o PostgreSQL.
+    historico : int, optional
+        Número de notificações guardadas, by default 1000.
+
+    Attributes
+    ----------
+    versao : int
+        Número de notificações recebidas desde o início.
+    """
+
+    def __init__(self, dsn, historico=1000):
+        self.dsn = dsn
+        self.versao = 0
+        self._inicios = deque(maxlen=historico)
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def oldest_since(self, versao):
+        """Retorna o menor timestamp das cotações anunciadas após uma versão.
+
+        Parameters
+        ----------
+        versao : int
+            Última versão vista pelo chamador.
+
+        Returns
+        -------
+        datetime.datetime or None
+            Timestamp (horário de São Paulo, sem timezone), ou None se alguma dessas
+            notificações já saiu do histórico ou não trazia o timestamp.
+        """
+        with self._lock:
+            inicios = [inicio for v, inicio in self._inicios if v > versao]
+            if len(inicios) < self.versao - versao or None in inicios:
+                return None
+        return min(inicios, default=None)
+
+    def _receive(self, notify):
+        try:
+            payload = json.loads(notify.payload)
+            inicio = payload.get("timestamp_inicial", payload["timestamp_moeda"])
+            inicio = to_sao_paulo(datetime.datetime.fromisoformat(inicio))
+            inicio = inicio.replace(tzinfo=None)
+        except (ValueError, KeyError, TypeError, AttributeError):
+            inicio = None
+        with self._lock:
+            self._inicios.append((self.versao + 1, inicio))
+            self.versao += 1
+
+    def _run(self):
+        while True:
+            conn = None
+            try:
+                conn = psycopg2.connect(self.dsn)
+                conn.set_isolation_level(
+                    psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT
+                )
+                with conn.cursor() as cursor:
+                    cursor.execute(f'LISTEN "{NOTIFY_CHANNEL}"')
+                while True:
+                    if select.select([conn], [], [], 60) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        self._receive(conn.notifies.pop(0))
+            except Exception:
+                # Qualquer falha (banco, rede, select) apenas reinicia a escuta; se a
+                # thread terminasse, o dashboard pararia de receber atualizações
+                time.sleep(5)
+            finally:
+                if conn is not None:
+                    conn.close()
+
+
+@st.cache_resource
+def get_quote_listener():
+    """
+    Cria o ouvinte de notificações de novas cotações, compartilhado entre as sessões.
+
+    Returns
+    -------
+    QuoteListener
+        Ouvinte do canal `NOTIFY_CHANNEL`.
+    """
+    return QuoteListener(DATABASE_URL)
+
+
+@st.fragment(run_every=2)
+def watch_new_quotes():
+    """
+    Verifica periodicamente se o pipeline anunciou novas cotações.
+
+    A verificação não acessa o banco: apenas compara a versão do `QuoteListener` com
+    a última vista pela sessão e, se houver novidade, reexecuta o dashboard, que então
+    anexa somente as cotações novas.
+    """
+    versao = get_quote_listener().versao
+    if versao != st.session_state.versao_cotacoes:
+        st.session_state.versao_cotacoes = versao
+        st.rerun()
+
+
+@st.cache_resource
+def get_rolling_statistics():
+    """
+    Cria as estatísticas em janelas deslizantes, compartilhadas entre as sessões do dashboard.
+
+    O estado é reconstruído a partir do banco apenas na primeira chamada; depois disso,
+    cada rerun só lê os ticks novos (ver `refresh_rolling_statistics`).
+
+    Returns
+    -------
+    dict
+        `estatisticas` (RollingStatistics), a `versao` do `QuoteListener` já
+        incorporada e o `lock` que serializa as atualizações.
+    """
+    versao = get_quote_listener().versao
+    rolling_statistics = RollingStatistics()
+    rolling_statistics.rebuild_from_db(Session)
+    return {
+        "estatisticas": rolling_statistics,
+        "versao": versao,
+        "lock": threading.Lock(),
+    }
+
+
+def refresh_rolling_statistics():
+    """
+    Atualiza as estatísticas compartilhadas com as cotações anunciadas pelo pipeline.
+
+    Se alguma cotação anunciada for anterior às já incorporadas (backfill), ou se o
+    trecho alterado for desconhecido, as estatísticas são reconstruídas.
+
+    Returns
+    -------
+    RollingStatistics
+        Estatísticas por par e por janela.
+    """
+    estado = get_rolling_statistics()
+    listener = get_quote_listener()
+    rolling_statistics = estado["estatisticas"]
+    with estado["lock"]:
+        versao = listener.versao
+        if versao == estado["versao"]:
+            rolling_statistics.refresh_from_db(Session)
+        else:
+            inicio = listener.oldest_since(estado["versao"])
+            if inicio is None:
+                rolling_statistics.rebuild_from_db(Session)
+            else:
+                rolling_statistics.refresh_from_db(Session, desde=inicio)
+            estado["versao"] = versao
+    return rolling_statistics
+
+
+def show_metrics(columns, estatisticas, sufixo):
+    """
+    Exibe as métricas de preço atual, máximo e mínimo de um período.
+
+    Parameters
+    ----------
+    columns : list
+        Três colunas do Streamlit onde as métricas serão exibidas.
+    estatisticas : dict or None
+        Estatísticas do período (ver `RollingWindow.snapshot`), ou None se não houver dados.
+    sufixo : str
+        Texto exibido entre parênteses no rótulo das métricas (ex: "hoje").
+    """
+    rotulos = ("Preço Atual", "Preço Máximo", "Preço Mínimo")
+    chaves = ("atual", "maximo", "minimo")
+    for column, rotulo, chave in zip(columns, rotulos, chaves):
+        if estatisticas:
+            column.metric(f"{rotulo} ({sufixo})", f"R$ {estatisticas[chave]:.2f}")
+        else:
+            column.metric(f"{rotulo} ({sufixo})", "N/A")
+
+
 def main():
     """
     Função principal que configura o dashboard Streamlit e exibe os dados do dólar.
@@ -83,7 +349,12 @@ def main():
         f"Este dashboard exibe os preços do dólar coletados periodicamente em um banco PostgreSQL."
     )
 
-    df = read_data_from_db()
+    if "versao_cotacoes" not in st.session_state:
+        st.session_state.versao_cotacoes = get_quote_listener().versao
+        st.session_state.versao_dados = st.session_state.versao_cotacoes
+    watch_new_quotes()
+
+    df = load_data()
 
     if not df.empty:
         st.subheader("Dados do Dólar recentes")
@@ -160,37 +431,26 @@ def main():
         else:
             st.warning(f"Nenhum dado disponível para o período: {periodo_texto}")
 
+        # Estatísticas incrementais (sem varrer o DataFrame)
+        rolling_statistics = get_rolling_statistics()["estatisticas"]
+        try:
+            rolling_statistics = refresh_rolling_statistics()
+        except Exception as e:
+            st.error(f"Erro ao atualizar as estatísticas: {e}")
+
         # Dados Estatísticos do dia atual
         st.subheader("Dados Estatísticos do Dia")
-        hoje = agora.date()
-        df_dia = df[df["timestamp_moeda"].dt.date == hoje]
-        col1, col2, col3 = st.columns(3)
-        if not df_dia.empty:
-            preco_atual = df_dia["valor_de_compra"].iloc[-1]
-            preco_maximo = df_dia["valor_de_compra"].max()
-            preco_minimo = df_dia["valor_de_compra"].min()
-            col1.metric("Preço Atual (hoje)", f"R$ {preco_atual:.2f}")
-            col2.metric("Preço Máximo (hoje)", f"R$ {preco_maximo:.2f}")
-            col3.metric("Preço Mínimo (hoje)", f"R$ {preco_minimo:.2f}")
-        else:
-            col1.metric("Preço Atual (hoje)", "N/A")
-            col2.metric("Preço Máximo (hoje)", "N/A")
-            col3.metric("Preço Mínimo (hoje)", "N/A")
+        show_metrics(
+            st.columns(3), rolling_statistics.get("USD", "BRL", "hoje"), "hoje"
+        )
 
         # Dados Estatísticos do período filtrado
         st.subheader(f"Dados Estatísticos do Período Selecionado: {periodo_texto}")
-        col4, col5, col6 = st.columns(3)
-        if not df_filtrado.empty:
-            preco_atual_f = df_filtrado["valor_de_compra"].iloc[-1]
-            preco_maximo_f = df_filtrado["valor_de_compra"].max()
-            preco_minimo_f = df_filtrado["valor_de_compra"].min()
-            col4.metric("Preço Atual (período)", f"R$ {preco_atual_f:.2f}")
-            col5.metric("Preço Máximo (período)", f"R$ {preco_maximo_f:.2f}")
-            col6.metric("Preço Mínimo (período)", f"R$ {preco_minimo_f:.2f}")
-        else:
-            col4.metric("Preço Atual (período)", "N/A")
-            col5.metric("Preço Máximo (período)", "N/A")
-            col6.metric("Preço Mínimo (período)", "N/A")
+        show_metrics(
+            st.columns(3),
+            rolling_statistics.get("USD", "BRL", st.session_state.periodo),
+            "período",
+        )
     else:
         st.warning("Nenhum dado disponível para exibição.")
 
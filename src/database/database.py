@@ -2,10 +2,21 @@
 Módulo de definição do modelo de dados e ORM para a tabela dolar_data no banco PostgreSQL.
 
 Este módulo define a estrutura da tabela que armazena os dados de cotação do dólar,
-incluindo campos para moedas, valores e timestamps.
+incluindo campos para moedas, valores e timestamps, da tabela de barras agregadas que
+guarda o histórico compactado e da tabela que registra os dias já verificados pelo
+backfill.
 """
 
-from sqlalchemy import Column, DateTime, Float, Integer, String
+from sqlalchemy import (
+    Column,
+    Date,
+    DateTime,
+    Float,
+    Index,
+    Integer,
+    String,
+    UniqueConstraint,
+)
 from sqlalchemy.orm import declarative_base
 
 Base = declarative_base()
@@ -34,6 +45,25 @@ class DolarData(Base):
     """
 
     __tablename__ = "dolar_data"
+    __table_args__ = (
+        # Permite buscar as cotações de um par por timestamp (backfill idempotente)
+        Index(
+            "ix_dolar_data_par_timestamp",
+            "moeda_origem",
+            "moeda_destino",
+            "timestamp_moeda",
+        ),
+        # Permite recortar as cotações por período sem filtrar por par (compactação e
+        # estatísticas)
+        Index("ix_dolar_data_timestamp", "timestamp_moeda"),
+        # Permite varrer os registros de um par em ordem de inserção (detecção de quedas)
+        Index(
+            "ix_dolar_data_par_criacao",
+            "moeda_origem",
+            "moeda_destino",
+            "timestamp_criacao",
+        ),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     moeda_origem = Column(String(3), nullable=False)
@@ -41,3 +71,102 @@ class DolarData(Base):
     valor_de_compra = Column(Float, nullable=False)
     timestamp_moeda = Column(DateTime(timezone=True), nullable=False)
     timestamp_criacao = Column(DateTime(timezone=True), nullable=False)
+
+
+class DolarBar(Base):
+    """Classe que representa a tabela dolar_data_barras no banco de dados.
+
+    Cada registro agrega as cotações de um par em um intervalo (minuto ou hora). As
+    cotações brutas mais antigas que o horizonte de retenção são compactadas nesta
+    tabela e removidas de dolar_data.
+
+    Attributes
+    ----------
+    id : int
+        Chave primária auto-incrementada.
+    moeda_origem : str
+        Código da moeda de origem (ex: USD).
+    moeda_destino : str
+        Código da moeda de destino (ex: BRL).
+    resolucao : str
+        Resolução da barra ("minute" ou "hour").
+    inicio : datetime
+        Início do intervalo da barra (com timezone).
+    abertura : float
+        Primeiro valor de compra do intervalo.
+    maxima : float
+        Maior valor de compra do intervalo.
+    minima : float
+        Menor valor de compra do intervalo.
+    fechamento : float
+        Último valor de compra do intervalo.
+    media : float
+        Média dos valores de compra do intervalo.
+    variancia : float
+        Variância populacional dos valores de compra do intervalo.
+    quantidade : int
+        Número de cotações agregadas.
+    """
+
+    __tablename__ = "dolar_data_barras"
+    __table_args__ = (
+        UniqueConstraint(
+            "moeda_origem",
+            "moeda_destino",
+            "resolucao",
+            "inicio",
+            name="uq_dolar_data_barras_par_resolucao_inicio",
+        ),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    moeda_origem = Column(String(3), nullable=False)
+    moeda_destino = Column(String(3), nullable=False)
+    resolucao = Column(String(8), nullable=False)
+    inicio = Column(DateTime(timezone=True), nullable=False)
+    abertura = Column(Float, nullable=False)
+    maxima = Column(Float, nullable=False)
+    minima = Column(Float, nullable=False)
+    fechamento = Column(Float, nullable=False)
+    media = Column(Float, nullable=False)
+    variancia = Column(Float, nullable=False)
+    quantidade = Column(Integer, nullable=False)
+
+
+class DolarBackfill(Base):
+    """Classe que representa a tabela dolar_data_backfill no banco de dados.
+
+    Cada registro indica até quando as cotações de um par em um dia já foram buscadas
+    pelo backfill. As lacunas cobertas por uma busca anterior não são buscadas de novo,
+    mesmo que a API não tenha retornado cotações para elas (feriados, períodos sem
+    negociação ou janelas que o endpoint não retorna).
+
+    Attributes
+    ----------
+    id : int
+        Chave primária auto-incrementada.
+    moeda_origem : str
+        Código da moeda de origem (ex: USD).
+    moeda_destino : str
+        Código da moeda de destino (ex: BRL).
+    dia : date
+        Dia buscado (horário de São Paulo).
+    verificado_ate : datetime
+        Momento da última busca do dia; lacunas que terminam antes dele estão cobertas.
+    """
+
+    __tablename__ = "dolar_data_backfill"
+    __table_args__ = (
+        UniqueConstraint(
+            "moeda_origem",
+            "moeda_destino",
+            "dia",
+            name="uq_dolar_data_backfill_par_dia",
+        ),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    moeda_origem = Column(String(3), nullable=False)
+    moeda_destino = Column(String(3), nullable=False)
+    dia = Column(Date, nullable=False)
+    verificado_ate = Column(DateTime(timezone=True), nullable=False)
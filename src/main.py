@@ -14,15 +14,29 @@ import threading
 import time
 from zoneinfo import ZoneInfo
 
-import logfire
-
-from src.config.config import configure_ambient_logging, configure_database
+from src.config.config import (
+    BACKFILL_RETRY_MINUTES,
+    configure_ambient_logging,
+    configure_database,
+    io_instrumentation,
+    should_trace_cycle,
+    span,
+)
 from src.database.database import Base, DolarData
+from src.pipeline.backfill import backfill_gaps
+from src.pipeline.compaction import compact_old_ticks
 from src.pipeline.extract import extract_data, extract_historical_data
-from src.pipeline.load import save_data_postgres
+from src.pipeline.load import save_batch_postgres, save_data_postgres
+from src.pipeline.scheduler import request_scheduler
+from src.pipeline.statistics import RollingStatistics
 from src.pipeline.transform import transform_data, transform_historical_data
 
 stop_event = threading.Event()
+rolling_statistics = RollingStatistics()
+# Sinaliza que o backfill inseriu cotações e as estatísticas devem ser reconstruídas
+statistics_outdated = threading.Event()
+# Sinaliza que o backfill terminou com dias pendentes (busca falhou) a repetir
+backfill_incomplete = threading.Event()
 
 
 def handle_sigterm(_signum, _frame):
@@ -88,6 +102,8 @@ def time_until_next_start():
 def create_tables(engine, logger):
     """Cria as tabelas no banco de dados PostgreSQL usando SQLAlchemy.
 
+    Os índices também são criados em tabelas que já existiam antes de serem declarados.
+
     Parameters
     ----------
     engine : sqlalchemy.engine.Engine
@@ -96,6 +112,9 @@ def create_tables(engine, logger):
         Logger para registrar logs do processo.
     """
     Base.metadata.create_all(engine)
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
     logger.info("Tabelas criadas/verificadas com sucesso.")
 
 
@@ -118,18 +137,35 @@ def is_db_empty(Session):
     """
     session = Session()
     try:
-        count = session.query(DolarData).count()
+        with io_instrumentation():
+            count = session.query(DolarData).count()
         return count == 0
     finally:
         session.close()
 
 
-def pipeline(Session, logger):
+def update_statistics(data):
+    """Alimenta as estatísticas em janelas deslizantes com um registro salvo.
+
+    Parameters
+    ----------
+    data : Quote
+        Cotação transformada e salva.
+    """
+    rolling_statistics.update(
+        data.moeda_origem,
+        data.moeda_destino,
+        data.valor_de_compra,
+        data.timestamp_moeda,
+    )
+
+
+def pipeline(Session, logger, trace=True):
     """
     Executa o pipeline ETL de cotação do dólar (USD-BRL).
     O pipeline verifica se o banco de dados está vazio. Se estiver, realiza uma carga histórica
     inicial dos últimos 3 meses. Caso contrário, executa o pipeline normal de extração,
-    transformação e carga.
+    transformação e carga. Cada registro salvo alimenta `rolling_statistics`.
 
     Parameters
     ----------
@@ -137,44 +173,89 @@ def pipeline(Session, logger):
         Classe de sessão do SQLAlchemy para interagir com o banco.
     logger : logging.Logger
         Logger para registrar logs do processo de ETL.
+    trace : bool, optional
+        Se False, as etapas não abrem spans no logfire, by default True.
     """
     if is_db_empty(Session):
-        with logfire.span("Carga histórica inicial"):
+        with span("Carga histórica inicial", trace):
             logger.info(
                 "Banco de dados vazio. Extraindo histórico dos últimos 3 meses..."
             )
-            with logfire.span("Extraindo dados históricos"):
+            with span("Extraindo dados históricos", trace):
                 data_hist = extract_historical_data(logger, days=90)
             if not data_hist:
                 logger.error(
                     "Falha ao extrair dados históricos. Encerrando o pipeline."
                 )
                 return
-            with logfire.span("Transformando dados históricos"):
+            with span("Transformando dados históricos", trace):
                 transformed_list = transform_historical_data(data_hist)
-            with logfire.span("Salvando dados históricos no PostgreSQL"):
-                for item in transformed_list:
-                    save_data_postgres(Session, item, logger)
+            with span("Salvando dados históricos no PostgreSQL", trace):
+                if save_batch_postgres(Session, transformed_list, logger):
+                    # A API histórica retorna as cotações da mais recente para a mais antiga
+                    for item in sorted(
+                        transformed_list, key=lambda item: item.timestamp_moeda
+                    ):
+                        update_statistics(item)
             logger.info("Carga histórica concluída com sucesso.")
         return
     # Pipeline normal
-    with logfire.span("Extraindo dados"):
+    with span("Extraindo dados", trace):
         data = extract_data(logger)
     if not data:
         logger.error("Nenhum dado foi extraído. Encerrando o pipeline.")
         return
-    with logfire.span("Transformando dados"):
+    with span("Transformando dados", trace):
         transformed_data = transform_data(data)
-    with logfire.span("Salvando dados no PostgreSQL"):
-        save_data_postgres(Session, transformed_data, logger)
+    with span("Salvando dados no PostgreSQL", trace):
+        if save_data_postgres(Session, transformed_data, logger):
+            update_statistics(transformed_data)
     logger.info("Pipeline de dados concluído com sucesso.")
 
 
+def recover_gaps(Session, logger, trace=True):
+    """Preenche as lacunas de cotações deixadas por períodos fora do ar.
+
+    Executada em uma thread de background, em paralelo ao polling ao vivo, para que o
+    `request_scheduler` dê prioridade às cotações ao vivo. Se alguma cotação for
+    inserida, `statistics_outdated` é sinalizado: as cotações do backfill chegam fora de
+    ordem, e `rolling_statistics` é reconstruído pela thread do pipeline. Se algum dia
+    não puder ser buscado (falha da API ou circuito aberto), `backfill_incomplete` é
+    sinalizado para que o backfill seja repetido.
+
+    Parameters
+    ----------
+    Session : sqlalchemy.orm.session.Session
+        Classe de sessão do SQLAlchemy para interagir com o banco.
+    logger : logging.Logger
+        Logger para registrar logs do backfill.
+    trace : bool, optional
+        Se False, o backfill não abre spans no logfire, by default True.
+    """
+    try:
+        with span("Preenchendo lacunas de cotações", trace):
+            inseridos, pendentes = backfill_gaps(Session, logger)
+        if inseridos:
+            statistics_outdated.set()
+        if pendentes:
+            backfill_incomplete.set()
+    except Exception as e:
+        logger.error("Erro ao preencher lacunas de cotações: %s", e)
+        backfill_incomplete.set()
+
+
 def loop_pipeline(Session, logger):
     """Executa o pipeline em loop contínuo com controle de horário.
 
     O pipeline executa apenas dentro do horário permitido (08:00-19:00, dias úteis).
-    Fora do horário, aguarda e faz logs informativos.
+    Fora do horário, aguarda e faz logs informativos. A cada ciclo, decide conforme
+    `INSTRUMENTATION_LEVEL` se o ciclo será rastreado pelo logfire. Antes do primeiro
+    ciclo, reconstrói `rolling_statistics` a partir do banco. As lacunas de cotações são
+    preenchidas em background a partir do primeiro ciclo e do ciclo seguinte a qualquer
+    erro inesperado, sem atrasar o polling ao vivo; se ficarem dias pendentes, o backfill
+    é repetido após `BACKFILL_RETRY_MINUTES`, quando o circuit breaker estiver fechado.
+    Fora do horário, as cotações antigas são compactadas uma vez por dia. Se o circuit breaker
+    das requisições estiver aberto, o próximo ciclo aguarda até ele aceitar requisições.
 
     Parameters
     ----------
@@ -183,25 +264,75 @@ def loop_pipeline(Session, logger):
     logger : logging.Logger
         Logger para registrar logs do pipeline.
     """
+    try:
+        rolling_statistics.rebuild_from_db(Session)
+    except Exception as e:
+        logger.error("Erro ao reconstruir as estatísticas a partir do banco: %s", e)
+    backfill_pending = True
+    backfill_thread = None
+    backfill_started = None
+    last_compaction = None
     while not stop_event.is_set():
         if is_within_allowed_time():
-            with logfire.span("Executando o pipeline"):
+            trace = should_trace_cycle()
+            with span("Executando o pipeline", trace):
                 try:
-                    pipeline(Session, logger)
-                    logger.info("Aguardando 30 segundos para a próxima execução...")
-                    stop_event.wait(30)
+                    if statistics_outdated.is_set():
+                        statistics_outdated.clear()
+                        rolling_statistics.rebuild_from_db(Session)
+                    backfill_running = (
+                        backfill_thread is not None and backfill_thread.is_alive()
+                    )
+                    if (
+                        backfill_incomplete.is_set()
+                        and not backfill_running
+                        and request_scheduler.retry_after() == 0
+                        and time.monotonic() - backfill_started
+                        >= BACKFILL_RETRY_MINUTES * 60
+                    ):
+                        backfill_incomplete.clear()
+                        backfill_pending = True
+                    if backfill_pending and not backfill_running:
+                        if not is_db_empty(Session):
+                            backfill_thread = threading.Thread(
+                                target=recover_gaps,
+                                args=(Session, logger, trace),
+                                name="backfill",
+                                daemon=True,
+                            )
+                            backfill_thread.start()
+                            backfill_started = time.monotonic()
+                        backfill_pending = False
+                    pipeline(Session, logger, trace)
+                    wait_time = max(30, request_scheduler.retry_after())
+                    logger.info(
+                        "Aguardando %d segundos para a próxima execução...", wait_time
+                    )
+                    stop_event.wait(wait_time)
                 except Exception as e:
-                    logger.error(f"Ocorreu um erro inesperado: {e}")
-                    time.sleep(30)
+                    logger.error("Ocorreu um erro inesperado: %s", e)
+                    backfill_pending = True
+                    time.sleep(max(30, request_scheduler.retry_after()))
             logger.info("Pipeline finalizado.")
         else:
+            today = datetime.datetime.now(ZoneInfo("America/Sao_Paulo")).date()
+            if last_compaction != today:
+                with span("Compactando cotações antigas", should_trace_cycle()):
+                    try:
+                        compact_old_ticks(Session, logger)
+                        last_compaction = today
+                    except Exception as e:
+                        logger.error("Erro ao compactar cotações antigas: %s", e)
             time_remaining = time_until_next_start()
             minutes, seconds = divmod(time_remaining.seconds, 60)
             hours, minutes = divmod(minutes, 60)
             logger.info(
-                f"Fora do horário permitido (08:00-19:00). "
-                f"Tempo restante até o próximo início: {hours:02d}:{minutes:02d}:{seconds:02d}. "
-                f"Checando novamente em 10 minutos..."
+                "Fora do horário permitido (08:00-19:00). "
+                "Tempo restante até o próximo início: %02d:%02d:%02d. "
+                "Checando novamente em 10 minutos...",
+                hours,
+                minutes,
+                seconds,
             )
             stop_event.wait(600)  # 10 minutos
     logger.info("Execução encerrada.")
@@ -0,0 +1,361 @@
+"""
+Módulo de detecção de lacunas e backfill direcionado das cotações.
+
+Quando o serviço fica fora do ar (queda, deploy ou erro no loop do pipeline), a tabela
+dolar_data fica com buracos. Este módulo encontra, por par de moedas, os intervalos em
+que o pipeline não gravou cotações dentro do horário de pregão (dias úteis, 08:00-19:00)
+e busca na API apenas os dias afetados, uma requisição por par e dia, em paralelo,
+salvando somente as cotações que ainda não existem. Cada dia buscado é registrado em
+dolar_data_backfill, para que a mesma janela não seja buscada de novo.
+"""
+
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import func, or_
+from sqlalchemy.dialects.postgresql import insert
+
+from src.config.config import (
+    BACKFILL_LOOKBACK_DAYS,
+    BACKFILL_MAX_GAP_MINUTES,
+    BACKFILL_WORKERS,
+    io_instrumentation,
+)
+from src.database.database import DolarBackfill, DolarData
+from src.pipeline.extract import extract_period_data
+from src.pipeline.load import save_missing_postgres
+from src.pipeline.statistics import TZ_SAO_PAULO, to_sao_paulo
+from src.pipeline.transform import transform_historical_data
+
+TRADING_START = datetime.time(8, 0)
+TRADING_END = datetime.time(19, 0)
+
+
+def trading_windows(inicio, fim):
+    """Recorta um intervalo nos trechos que caem dentro do horário de pregão.
+
+    Parameters
+    ----------
+    inicio : datetime.datetime
+        Início do intervalo (com timezone).
+    fim : datetime.datetime
+        Fim do intervalo (com timezone).
+
+    Returns
+    -------
+    list of tuple
+        Trechos (inicio, fim) em dias úteis, entre 08:00 e 19:00 (horário de São Paulo).
+    """
+    inicio = to_sao_paulo(inicio)
+    fim = to_sao_paulo(fim)
+    windows = []
+    dia = inicio.date()
+    while dia <= fim.date():
+        if dia.weekday() < 5:
+            abertura = datetime.datetime.combine(dia, TRADING_START, TZ_SAO_PAULO)
+            fechamento = datetime.datetime.combine(dia, TRADING_END, TZ_SAO_PAULO)
+            trecho_inicio = max(inicio, abertura)
+            trecho_fim = min(fim, fechamento)
+            if trecho_inicio < trecho_fim:
+                windows.append((trecho_inicio, trecho_fim))
+        dia += datetime.timedelta(days=1)
+    return windows
+
+
+def find_gaps(Session, max_intervalo=None, desde=None, ate=None):
+    """Encontra as lacunas de cotações por par de moedas no horário de pregão.
+
+    Uma lacuna é um período em que o pipeline não gravou cotações, detectado por
+    `timestamp_criacao` (horário da gravação) e não por `timestamp_moeda`: feriados e
+    períodos em que a cotação não muda não são confundidos com quedas do serviço. Os
+    registros de cada par são percorridos em ordem de `timestamp_criacao` (pelo índice
+    `ix_dolar_data_par_criacao`), comparando cada um com o anterior via `LAG`. O trecho
+    entre o último registro de cada par e `ate` também é considerado. Um par com
+    registros anteriores a `desde` é tratado como se tivesse um registro em `desde`: uma
+    queda que começou antes da varredura é reportada a partir de `desde`, e um par sem
+    registros na varredura produz a lacuna `(desde, ate)` inteira. Os trechos já
+    cobertos por uma busca anterior (ver `DolarBackfill`) são descontados.
+
+    Parameters
+    ----------
+    Session : sqlalchemy.orm.session.Session
+        Classe de sessão do SQLAlchemy para interagir com o banco.
+    max_intervalo : datetime.timedelta, optional
+        Maior intervalo aceitável entre duas gravações, by default
+        `BACKFILL_MAX_GAP_MINUTES` minutos.
+    desde : datetime.datetime, optional
+        Início da varredura, by default `BACKFILL_LOOKBACK_DAYS` dias atrás.
+    ate : datetime.datetime, optional
+        Fim da varredura, by default o horário atual.
+
+    Returns
+    -------
+    list of tuple
+        Lacunas (moeda_origem, moeda_destino, inicio, fim), já recortadas ao horário de
+        pregão, sem os trechos já buscados e com duração maior que `max_intervalo`.
+    """
+    if max_intervalo is None:
+        max_intervalo = datetime.timedelta(minutes=BACKFILL_MAX_GAP_MINUTES)
+    ate = ate or datetime.datetime.now(TZ_SAO_PAULO)
+    desde = desde or ate - datetime.timedelta(days=BACKFILL_LOOKBACK_DAYS)
+
+    session = Session()
+    try:
+        with io_instrumentation():
+            anterior = (
+                func.lag(DolarData.timestamp_criacao)
+                .over(
+                    partition_by=(DolarData.moeda_origem, DolarData.moeda_destino),
+                    order_by=DolarData.timestamp_criacao,
+                )
+                .label("anterior")
+            )
+            gravacoes = (
+                session.query(
+                    DolarData.moeda_origem,
+                    DolarData.moeda_destino,
+                    DolarData.timestamp_criacao.label("atual"),
+                    anterior,
+                )
+                .filter(DolarData.timestamp_criacao.between(desde, ate))
+                .subquery()
+            )
+            candidatas = session.query(gravacoes).filter(
+                or_(
+                    gravacoes.c.anterior.is_(None),
+                    gravacoes.c.atual - gravacoes.c.anterior > max_intervalo,
+                )
+            )
+            ultimos = {
+                (origem, destino): ultimo
+                for origem, destino, ultimo in session.query(
+                    DolarData.moeda_origem,
+                    DolarData.moeda_destino,
+                    func.max(DolarData.timestamp_criacao),
+                )
+                .filter(DolarData.timestamp_criacao.between(desde, ate))
+                .group_by(DolarData.moeda_origem, DolarData.moeda_destino)
+            }
+            # Pares com registros antes da varredura
+            anteriores = {
+                (origem, destino)
+                for origem, destino in session.query(
+                    DolarData.moeda_origem, DolarData.moeda_destino
+                )
+                .filter(DolarData.timestamp_criacao < desde)
+                .group_by(DolarData.moeda_origem, DolarData.moeda_destino)
+            }
+            lacunas = []
+            for row in candidatas:
+                inicio = row.anterior
+                if inicio is None:
+                    # Primeiro registro da varredura: a referência é o início dela
+                    if (row.moeda_origem, row.moeda_destino) not in anteriores:
+                        continue
+                    inicio = desde
+                if row.atual - inicio > max_intervalo:
+                    lacunas.append(
+                        (row.moeda_origem, row.moeda_destino, inicio, row.atual)
+                    )
+            verificados = {
+                (row.moeda_origem, row.moeda_destino, row.dia): row.verificado_ate
+                for row in session.query(DolarBackfill).filter(
+                    DolarBackfill.dia.between(
+                        to_sao_paulo(desde).date(), to_sao_paulo(ate).date()
+                    )
+                )
+            }
+    finally:
+        session.close()
+
+    for par in anteriores - ultimos.keys():
+        ultimos[par] = desde
+    for (origem, destino), ultimo in ultimos.items():
+        if ate - ultimo > max_intervalo:
+            lacunas.append((origem, destino, ultimo, ate))
+
+    gaps = []
+    for origem, destino, inicio, fim in lacunas:
+        for trecho_inicio, trecho_fim in trading_windows(inicio, fim):
+            verificado_ate = verificados.get((origem, destino, trecho_inicio.date()))
+            if verificado_ate is not None:
+                trecho_inicio = max(trecho_inicio, to_sao_paulo(verificado_ate))
+            if trecho_fim - trecho_inicio > max_intervalo:
+                gaps.append((origem, destino, trecho_inicio, trecho_fim))
+    return gaps
+
+
+def group_by_day(gaps):
+    """Agrupa as lacunas por par de moedas e dia.
+
+    Parameters
+    ----------
+    gaps : list of tuple
+        Lacunas (moeda_origem, moeda_destino, inicio, fim) retornadas por `find_gaps`.
+
+    Returns
+    -------
+    dict
+        Mapeamento (moeda_origem, moeda_destino, dia) -> lista de janelas (inicio, fim).
+    """
+    dias = {}
+    for moeda_origem, moeda_destino, inicio, fim in gaps:
+        chave = (moeda_origem, moeda_destino, to_sao_paulo(inicio).date())
+        dias.setdefault(chave, []).append((inicio, fim))
+    return dias
+
+
+def mark_verified(Session, moeda_origem, moeda_destino, dia, verificado_ate):
+    """Registra que as cotações de um par em um dia foram buscadas até um instante.
+
+    Parameters
+    ----------
+    Session : sqlalchemy.orm.session.Session
+        Classe de sessão do SQLAlchemy para interagir com o banco.
+    moeda_origem : str
+        Código da moeda de origem (ex: USD).
+    moeda_destino : str
+        Código da moeda de destino (ex: BRL).
+    dia : datetime.date
+        Dia buscado.
+    verificado_ate : datetime.datetime
+        Momento em que a busca foi feita.
+    """
+    statement = insert(DolarBackfill).values(
+        moeda_origem=moeda_origem,
+        moeda_destino=moeda_destino,
+        dia=dia,
+        verificado_ate=verificado_ate,
+    )
+    statement = statement.on_conflict_do_update(
+        constraint="uq_dolar_data_backfill_par_dia",
+        set_={
+            "verificado_ate": func.greatest(
+                DolarBackfill.verificado_ate, statement.excluded.verificado_ate
+            )
+        },
+    )
+    session = Session()
+    try:
+        with io_instrumentation():
+            session.execute(statement)
+            session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def backfill_day(Session, logger, moeda_origem, moeda_destino, dia, janelas):
+    """Busca e salva as cotações faltantes de um par em um dia.
+
+    O endpoint da API filtra por dia, então todas as janelas do dia são atendidas por
+    uma única requisição. Se a busca tiver sucesso, o dia é registrado como verificado
+    mesmo que nenhuma cotação nova tenha sido encontrada; se falhar, ele não é
+    registrado e será buscado de novo no próximo backfill.
+
+    Parameters
+    ----------
+    Session : sqlalchemy.orm.session.Session
+        Classe de sessão do SQLAlchemy para interagir com o banco.
+    logger : logging.Logger
+        Logger para registrar logs do backfill.
+    moeda_origem : str
+        Código da moeda de origem (ex: USD).
+    moeda_destino : str
+        Código da moeda de destino (ex: BRL).
+    dia : datetime.date
+        Dia das janelas.
+    janelas : list of tuple
+        Janelas (inicio, fim) sem cotações no dia.
+
+    Returns
+    -------
+    list of Quote or None
+        Cotações inseridas, ou None se a busca ou o salvamento falhou.
+    """
+    verificado_ate = datetime.datetime.now(TZ_SAO_PAULO)
+    inicio = min(janela[0] for janela in janelas)
+    fim = max(janela[1] for janela in janelas)
+    data = extract_period_data(logger, moeda_origem, moeda_destino, inicio, fim)
+    if data is None:
+        return None
+    transformed = [
+        item
+        for item in transform_historical_data(data)
+        if any(a < item.timestamp_moeda < b for a, b in janelas)
+    ]
+    inseridos = save_missing_postgres(Session, transformed, logger)
+    if inseridos is None:
+        return None
+    mark_verified(Session, moeda_origem, moeda_destino, dia, verificado_ate)
+    return inseridos
+
+
+def backfill_gaps(Session, logger, gaps=None, max_workers=None):
+    """Preenche as lacunas de cotações buscando apenas os dias afetados.
+
+    As lacunas são agrupadas por par e dia; os dias são buscados e salvos em paralelo,
+    cada um em sua própria transação e de forma idempotente (ver `save_missing_postgres`).
+
+    Parameters
+    ----------
+    Session : sqlalchemy.orm.session.Session
+        Classe de sessão do SQLAlchemy para interagir com o banco.
+    logger : logging.Logger
+        Logger para registrar logs do backfill.
+    gaps : list of tuple, optional
+        Lacunas a preencher, by default as encontradas por `find_gaps`.
+    max_workers : int, optional
+        Número de dias processados em paralelo, by default `BACKFILL_WORKERS`.
+
+    Returns
+    -------
+    tuple
+        Cotações inseridas em todos os dias (list of Quote) e número de dias cuja busca
+        falhou (int), que continuam pendentes.
+    """
+    if gaps is None:
+        gaps = find_gaps(Session)
+    if not gaps:
+        return [], 0
+    dias = group_by_day(gaps)
+    logger.info(
+        "%d lacunas de cotações encontradas em %d dias. Iniciando backfill...",
+        len(gaps),
+        len(dias),
+    )
+
+    def run(item):
+        (moeda_origem, moeda_destino, dia), janelas = item
+        try:
+            return backfill_day(
+                Session, logger, moeda_origem, moeda_destino, dia, janelas
+            )
+        except Exception as e:
+            logger.error(
+                "Erro no backfill de %s-%s em %s: %s",
+                moeda_origem,
+                moeda_destino,
+                dia,
+                e,
+            )
+            return None
+
+    inseridos = []
+    pendentes = 0
+    with ThreadPoolExecutor(
+        max_workers=max_workers or BACKFILL_WORKERS, thread_name_prefix="backfill"
+    ) as executor:
+        for resultado in executor.map(run, dias.items()):
+            if resultado is None:
+                pendentes += 1
+            else:
+                inseridos.extend(resultado)
+    logger.info(
+        "Backfill concluído: %d cotações inseridas, %d dias pendentes.",
+        len(inseridos),
+        pendentes,
+    )
+    return inseridos, pendentes
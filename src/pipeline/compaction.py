@@ -0,0 +1,233 @@
+"""
+Módulo de retenção e compactação das cotações brutas.
+
+As cotações de dolar_data mais antigas que o horizonte de retenção são agregadas em
+barras por minuto ou por hora (tabela dolar_data_barras) e depois removidas em lotes
+pequenos, cada um em sua própria transação, para não segurar locks por muito tempo.
+Assim a tabela quente fica com tamanho limitado e o histórico longo continua
+consultável nas barras.
+"""
+
+import datetime
+import time
+
+from sqlalchemy import func, text
+
+from src.config.config import (
+    COMPACTION_BATCH_SIZE,
+    COMPACTION_RESOLUTION,
+    RAW_RETENTION_DAYS,
+    io_instrumentation,
+)
+from src.database.database import DolarData
+from src.pipeline.statistics import JANELAS_PADRAO, TZ_SAO_PAULO
+
+RESOLUCOES = ("minute", "hour")
+
+# As janelas limitadas das estatísticas só leem cotações brutas; a retenção não pode
+# ser menor que a mais longa delas
+MAIOR_JANELA = max(
+    duracao
+    for duracao in JANELAS_PADRAO.values()
+    if isinstance(duracao, datetime.timedelta)
+)
+if datetime.timedelta(days=RAW_RETENTION_DAYS) < MAIOR_JANELA:
+    raise ValueError(
+        f"RAW_RETENTION_DAYS ({RAW_RETENTION_DAYS}) não pode ser menor que a maior "
+        f"janela das estatísticas ({MAIOR_JANELA.days} dias)"
+    )
+
+# Barras de um intervalo [inicio, fim); ON CONFLICT torna a agregação idempotente.
+# Repetições do mesmo timestamp (polls sem nova cotação) contam uma vez, como nas
+# estatísticas incrementais (`RollingStatistics.update`).
+INSERT_BARS = text(
+    """
+    INSERT INTO dolar_data_barras (
+        moeda_origem, moeda_destino, resolucao, inicio, abertura, maxima, minima,
+        fechamento, media, variancia, quantidade
+    )
+    SELECT
+        moeda_origem,
+        moeda_destino,
+        :resolucao,
+        date_trunc(:resolucao, timestamp_moeda AT TIME ZONE 'UTC') AT TIME ZONE 'UTC',
+        (array_agg(valor_de_compra ORDER BY timestamp_moeda))[1],
+        max(valor_de_compra),
+        min(valor_de_compra),
+        (array_agg(valor_de_compra ORDER BY timestamp_moeda DESC))[1],
+        avg(valor_de_compra),
+        var_pop(valor_de_compra),
+        count(*)
+    FROM (
+        SELECT DISTINCT ON (moeda_origem, moeda_destino, timestamp_moeda)
+            moeda_origem, moeda_destino, valor_de_compra, timestamp_moeda
+        FROM dolar_data
+        WHERE timestamp_moeda >= :inicio AND timestamp_moeda < :fim
+        ORDER BY moeda_origem, moeda_destino, timestamp_moeda, id
+    ) AS ticks
+    GROUP BY 1, 2, 4
+    ON CONFLICT (moeda_origem, moeda_destino, resolucao, inicio) DO NOTHING
+    """
+)
+
+DELETE_BATCH = text(
+    """
+    DELETE FROM dolar_data
+    WHERE id IN (
+        SELECT id FROM dolar_data
+        WHERE timestamp_moeda >= :inicio AND timestamp_moeda < :fim
+        LIMIT :limite
+    )
+    """
+)
+
+
+def truncate(timestamp, resolucao):
+    """Trunca um timestamp no início do minuto ou da hora.
+
+    Parameters
+    ----------
+    timestamp : datetime.datetime
+        Timestamp a ser truncado.
+    resolucao : str
+        "minute" ou "hour".
+
+    Returns
+    -------
+    datetime.datetime
+        Timestamp truncado.
+    """
+    if resolucao == "hour":
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    return timestamp.replace(second=0, microsecond=0)
+
+
+def delete_in_batches(Session, inicio, fim, batch_size, pausa):
+    """Remove as cotações brutas de um intervalo em lotes pequenos.
+
+    Parameters
+    ----------
+    Session : sqlalchemy.orm.session.Session
+        Classe de sessão do SQLAlchemy para interagir com o banco.
+    inicio : datetime.datetime
+        Início do intervalo (inclusivo).
+    fim : datetime.datetime
+        Fim do intervalo (exclusivo).
+    batch_size : int
+        Número máximo de linhas removidas por transação.
+    pausa : float
+        Pausa em segundos entre os lotes.
+
+    Returns
+    -------
+    int
+        Número de linhas removidas.
+    """
+    removidas = 0
+    while True:
+        session = Session()
+        try:
+            with io_instrumentation():
+                result = session.execute(
+                    DELETE_BATCH, {"inicio": inicio, "fim": fim, "limite": batch_size}
+                )
+                session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+        removidas += result.rowcount
+        if result.rowcount < batch_size:
+            return removidas
+        time.sleep(pausa)
+
+
+def compact_old_ticks(
+    Session, logger, horizonte=None, resolucao=None, batch_size=None, pausa=0.1
+):
+    """Compacta em barras as cotações brutas mais antigas que o horizonte de retenção.
+
+    O período antigo é processado um dia por vez: as barras do dia são gravadas (de
+    forma idempotente) e só então as cotações brutas do dia são removidas em lotes. Se
+    o processo for interrompido, a próxima execução retoma sem duplicar barras.
+
+    Parameters
+    ----------
+    Session : sqlalchemy.orm.session.Session
+        Classe de sessão do SQLAlchemy para interagir com o banco.
+    logger : logging.Logger
+        Logger para registrar logs da compactação.
+    horizonte : datetime.timedelta, optional
+        Por quanto tempo as cotações brutas são mantidas, by default
+        `RAW_RETENTION_DAYS` dias.
+    resolucao : str, optional
+        Resolução das barras, "minute" ou "hour", by default `COMPACTION_RESOLUTION`.
+    batch_size : int, optional
+        Linhas removidas por transação, by default `COMPACTION_BATCH_SIZE`.
+    pausa : float, optional
+        Pausa em segundos entre os lotes de remoção, by default 0.1.
+
+    Returns
+    -------
+    int
+        Número de cotações brutas removidas.
+
+    Raises
+    ------
+    ValueError
+        Se a resolução não for "minute" nem "hour" ou se o horizonte for menor que a
+        maior janela limitada das estatísticas (`MAIOR_JANELA`).
+    """
+    horizonte = horizonte or datetime.timedelta(days=RAW_RETENTION_DAYS)
+    resolucao = resolucao or COMPACTION_RESOLUTION
+    batch_size = batch_size or COMPACTION_BATCH_SIZE
+    if resolucao not in RESOLUCOES:
+        raise ValueError(f"Resolução de compactação inválida: {resolucao}")
+    if horizonte < MAIOR_JANELA:
+        raise ValueError(
+            f"Horizonte de retenção ({horizonte}) menor que a maior janela das "
+            f"estatísticas ({MAIOR_JANELA})"
+        )
+
+    # Alinha o corte à resolução para nunca compactar uma barra pela metade
+    corte = truncate(datetime.datetime.now(TZ_SAO_PAULO) - horizonte, resolucao)
+    session = Session()
+    try:
+        with io_instrumentation():
+            mais_antiga = (
+                session.query(func.min(DolarData.timestamp_moeda))
+                .filter(DolarData.timestamp_moeda < corte)
+                .scalar()
+            )
+    finally:
+        session.close()
+    if mais_antiga is None:
+        logger.info("Nenhuma cotação anterior a %s para compactar.", corte)
+        return 0
+
+    removidas = 0
+    inicio = truncate(mais_antiga, resolucao)
+    while inicio < corte:
+        fim = min(inicio + datetime.timedelta(days=1), corte)
+        session = Session()
+        try:
+            with io_instrumentation():
+                session.execute(
+                    INSERT_BARS, {"resolucao": resolucao, "inicio": inicio, "fim": fim}
+                )
+                session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+        removidas += delete_in_batches(Session, inicio, fim, batch_size, pausa)
+        inicio = fim
+    logger.info(
+        "Compactação concluída: %d cotações anteriores a %s agregadas em barras (%s).",
+        removidas,
+        corte,
+        resolucao,
+    )
+    return removidas
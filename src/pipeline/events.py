@@ -0,0 +1,130 @@
+"""
+Módulo de notificação de novas cotações.
+
+Define o canal do PostgreSQL usado com `NOTIFY`/`LISTEN` e um broker em memória que
+repassa as cotações salvas pelo pipeline aos assinantes do mesmo processo (por exemplo,
+o stream de Server-Sent Events do serviço web).
+"""
+
+import json
+import queue
+import threading
+
+# Canal do PostgreSQL notificado a cada lote de cotações inseridas
+NOTIFY_CHANNEL = "dolar_data_novos"
+
+
+def quote_to_json(data):
+    """Converte uma cotação transformada em um dicionário serializável em JSON.
+
+    Parameters
+    ----------
+    data : Quote
+        Cotação transformada.
+
+    Returns
+    -------
+    dict
+        Cotação com valor numérico e timestamps no formato ISO 8601.
+    """
+    return {
+        "moeda_origem": data.moeda_origem,
+        "moeda_destino": data.moeda_destino,
+        "valor_de_compra": data.valor_de_compra,
+        "timestamp_moeda": data.timestamp_moeda.isoformat(),
+    }
+
+
+def notify_payload(data_list):
+    """Monta o payload do `NOTIFY` de um lote de cotações.
+
+    O payload do PostgreSQL é limitado a 8000 bytes, então apenas um resumo do lote é
+    enviado; os ouvintes buscam as linhas novas no banco.
+
+    Parameters
+    ----------
+    data_list : list of Quote
+        Cotações inseridas no lote.
+
+    Returns
+    -------
+    str
+        Payload em JSON com o par, a quantidade, o maior timestamp do lote e o menor
+        (`timestamp_inicial`). Um `timestamp_inicial` anterior aos dados que o ouvinte
+        já tem indica cotações do backfill, que devem ser relidas a partir dele.
+    """
+    primeiro = min(data_list, key=lambda data: data.timestamp_moeda)
+    ultimo = max(data_list, key=lambda data: data.timestamp_moeda)
+    return json.dumps(
+        {
+            "moeda_origem": ultimo.moeda_origem,
+            "moeda_destino": ultimo.moeda_destino,
+            "quantidade": len(data_list),
+            "timestamp_inicial": primeiro.timestamp_moeda.isoformat(),
+            "timestamp_moeda": ultimo.timestamp_moeda.isoformat(),
+        }
+    )
+
+
+class QuoteBroker:
+    """Broker em memória que distribui lotes de cotações para os assinantes.
+
+    Cada assinante recebe uma fila limitada; se um assinante lento encher a fila, os
+    lotes seguintes são descartados para ele, sem bloquear o pipeline.
+
+    Parameters
+    ----------
+    maxsize : int, optional
+        Tamanho máximo da fila de cada assinante, by default 100.
+    """
+
+    def __init__(self, maxsize=100):
+        self.maxsize = maxsize
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self):
+        """Registra um novo assinante.
+
+        Returns
+        -------
+        queue.Queue
+            Fila onde os lotes de cotações (listas de dicionários) serão entregues.
+        """
+        subscription = queue.Queue(maxsize=self.maxsize)
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """Remove um assinante.
+
+        Parameters
+        ----------
+        subscription : queue.Queue
+            Fila retornada por `subscribe`.
+        """
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def publish(self, data_list):
+        """Publica um lote de cotações para todos os assinantes.
+
+        Parameters
+        ----------
+        data_list : list of Quote
+            Cotações transformadas.
+        """
+        with self._lock:
+            subscribers = list(self._subscribers)
+        if not subscribers:
+            return
+        cotacoes = [quote_to_json(data) for data in data_list]
+        for subscription in subscribers:
+            try:
+                subscription.put_nowait(cotacoes)
+            except queue.Full:
+                pass
+
+
+quote_broker = QuoteBroker()
@@ -2,20 +2,40 @@
 Módulo responsável pela extração de dados da cotação do dólar (USD-BRL) via API.
 
 Este módulo contém funções para conectar com APIs externas de cotação de moedas
-e extrair dados atualizados do dólar em relação ao real brasileiro.
+e extrair dados atualizados do dólar em relação ao real brasileiro. As respostas são
+decodificadas diretamente em registros `Quote`, rejeitando payloads malformados. A última
+cotação é buscada nas fontes configuradas em `QUOTE_SOURCES`, com requisições "hedged".
+As requisições à AwesomeAPI passam pelo `request_scheduler`, que respeita a cota do plano.
 """
 
-import requests
+from src.config.config import (
+    HEDGE_PERCENTILE,
+    QUOTE_SOURCE_TOKENS,
+    QUOTE_SOURCES,
+    TOKEN_AWESOMEAPI,
+)
+from src.pipeline.quote import QuoteDecodeError, decode_list
+from src.pipeline.scheduler import PRIORIDADE_BACKFILL, request_scheduler
+from src.pipeline.sources import HedgedExtractor, build_sources
 
-from src.config.config import TOKEN_AWESOMEAPI
+quote_extractor = HedgedExtractor(
+    build_sources(
+        QUOTE_SOURCES,
+        token=TOKEN_AWESOMEAPI,
+        scheduler=request_scheduler,
+        source_tokens=QUOTE_SOURCE_TOKENS,
+    ),
+    hedge_percentile=HEDGE_PERCENTILE,
+)
 
 
 def extract_data(logger):
     """
-    Extrai dados da API AwesomeAPI para obter a cotação do dólar (USD-BRL).
+    Extrai a cotação atual do dólar (USD-BRL) das fontes configuradas.
 
-    Faz uma requisição HTTP para a API AwesomeAPI para obter dados atualizados
-    da cotação do dólar em relação ao real brasileiro.
+    Consulta primeiro a fonte com melhor histórico de latência; se ela demorar mais que
+    o percentil `HEDGE_PERCENTILE` da sua latência ou falhar, consulta a próxima fonte em
+    paralelo e usa a primeira resposta válida (ver `HedgedExtractor`).
 
     Parameters
     ----------
@@ -24,24 +44,16 @@ def extract_data(logger):
 
     Returns
     -------
-    dict or None
-        Dicionário contendo os dados extraídos da API, ou None se houver erro.
+    Quote or None
+        Cotação extraída, ou None se nenhuma fonte retornou dados válidos.
 
     Examples
     --------
-    >>> data = extract_data(logger)
-    >>> if data:
-    ...     print(f"USD-BRL: {data['USDBRL']['bid']}")
+    >>> quote = extract_data(logger)
+    >>> if quote:
+    ...     print(f"USD-BRL: {quote.valor_de_compra}")
     """
-    url = (
-        f"https://economia.awesomeapi.com.br/json/last/USD-BRL?token={TOKEN_AWESOMEAPI}"
-    )
-    response = requests.get(url)
-    if response.status_code == 200:
-        return response.json()
-    else:
-        logger.error(f"Erro ao acessar a API: {response.status_code} - {response.text}")
-        return None
+    return quote_extractor.fetch(logger)
 
 
 def extract_historical_data(logger, days=90):
@@ -59,24 +71,78 @@ def extract_historical_data(logger, days=90):
 
     Returns
     -------
-    list or None
-        Lista de dicionários contendo os dados históricos extraídos da API,
-        ou None se houver erro.
+    list of Quote or None
+        Lista com as cotações históricas extraídas da API, ou None se houver erro.
     """
     if days > 90:
         days = 90
     url = f"https://economia.awesomeapi.com.br/json/daily/USD-BRL/{days}?token={TOKEN_AWESOMEAPI}"
-    response = requests.get(url)
+    response = request_scheduler.get(url, PRIORIDADE_BACKFILL, timeout=30)
     if response.status_code == 200:
-        data = response.json()
-        if isinstance(data, list):
-            return data
-        else:
+        try:
+            return decode_list(response.content)
+        except QuoteDecodeError as e:
             logger.error(
-                f"Resposta inesperada da API histórica: {data} (esperado uma lista de dicionários)."
+                "Resposta inesperada da API histórica: %s (esperado uma lista de cotações).",
+                e,
             )
             return None
     else:
         logger.error(
-            f"Erro ao acessar a API histórica: {response.status_code} - {response.text}"
+            "Erro ao acessar a API histórica: %s - %s",
+            response.status_code,
+            response.text,
         )
+
+
+def extract_period_data(logger, moeda_origem, moeda_destino, inicio, fim):
+    """
+    Extrai as cotações de um par de moedas em um intervalo de datas da API AwesomeAPI.
+
+    Usada pelo backfill para buscar apenas as janelas em que faltam dados. A API filtra
+    por dia, então o resultado pode conter cotações fora do intervalo pedido. A
+    requisição tem prioridade de backfill no `request_scheduler`, cedendo a vez às
+    cotações ao vivo.
+
+    Parameters
+    ----------
+    logger : logging.Logger
+        Logger para registrar logs do processo de extração.
+    moeda_origem : str
+        Código da moeda de origem (ex: USD).
+    moeda_destino : str
+        Código da moeda de destino (ex: BRL).
+    inicio : datetime.datetime
+        Início do intervalo.
+    fim : datetime.datetime
+        Fim do intervalo.
+
+    Returns
+    -------
+    list of Quote or None
+        Lista com as cotações do período, ou None se houver erro.
+    """
+    url = (
+        f"https://economia.awesomeapi.com.br/json/daily/{moeda_origem}-{moeda_destino}/360"
+        f"?start_date={inicio:%Y%m%d}&end_date={fim:%Y%m%d}&token={TOKEN_AWESOMEAPI}"
+    )
+    response = request_scheduler.get(url, PRIORIDADE_BACKFILL, timeout=30)
+    if response.status_code == 200:
+        try:
+            return decode_list(response.content)
+        except QuoteDecodeError as e:
+            logger.error(
+                "Resposta inesperada da API para o período %s a %s: %s",
+                inicio,
+                fim,
+                e,
+            )
+            return None
+    logger.error(
+        "Erro ao acessar a API para o período %s a %s: %s - %s",
+        inicio,
+        fim,
+        response.status_code,
+        response.text,
+    )
+    return None
@@ -2,24 +2,49 @@
 Módulo responsável pelo carregamento dos dados transformados no banco de dados PostgreSQL.
 
 Este módulo contém funções para persistir os dados processados no banco de dados,
-utilizando SQLAlchemy ORM para operações de inserção.
+utilizando inserções em lote do SQLAlchemy a partir dos registros `Quote`. Cada inserção confirmada emite um
+`NOTIFY` no canal `NOTIFY_CHANNEL` e é publicada no broker em memória `quote_broker`.
 """
 
+from sqlalchemy import insert, text
+
+from src.config.config import io_instrumentation
 from src.database.database import DolarData
+from src.pipeline.events import NOTIFY_CHANNEL, notify_payload, quote_broker
+
+
+def notify_new_quotes(session, data_list):
+    """Agenda o `NOTIFY` de um lote de cotações na transação atual.
+
+    O PostgreSQL só entrega a notificação quando a transação é confirmada, então os
+    ouvintes nunca são avisados de dados revertidos.
+
+    Parameters
+    ----------
+    session : sqlalchemy.orm.Session
+        Sessão com a transação de inserção em andamento.
+    data_list : list of Quote
+        Cotações inseridas na transação.
+    """
+    session.execute(
+        text("SELECT pg_notify(:canal, :payload)"),
+        {"canal": NOTIFY_CHANNEL, "payload": notify_payload(data_list)},
+    )
 
 
 def save_data_postgres(Session, data, logger):
     """Salva os dados transformados no banco de dados PostgreSQL.
 
-    Utiliza uma sessão do SQLAlchemy para adicionar um novo registro na tabela DolarData.
-    Se ocorrer um erro, a transação é revertida automaticamente.
+    Utiliza uma sessão do SQLAlchemy para inserir um novo registro na tabela DolarData.
+    Se ocorrer um erro, a transação é revertida automaticamente. Após a confirmação, os
+    ouvintes do canal `NOTIFY_CHANNEL` e os assinantes de `quote_broker` são avisados.
 
     Parameters
     ----------
     Session : sqlalchemy.orm.session.Session
         Classe de sessão do SQLAlchemy para interagir com o banco.
-    data : dict
-        Dicionário contendo os dados transformados com as chaves:
+    data : Quote
+        Cotação transformada, com os campos:
         - moeda_origem: Código da moeda de origem
         - moeda_destino: Código da moeda de destino
         - valor_de_compra: Valor de compra
@@ -28,29 +53,136 @@ def save_data_postgres(Session, data, logger):
     logger : logging.Logger
         Logger para registrar logs do processo de salvamento.
 
+    Returns
+    -------
+    bool
+        True se o registro foi salvo, False se ocorreu um erro.
+
     Examples
     --------
-    >>> data = {
-    ...     "moeda_origem": "USD",
-    ...     "moeda_destino": "BRL",
-    ...     "valor_de_compra": 5.12,
-    ...     "timestamp_moeda": datetime.now(),
-    ...     "timestamp_criacao": datetime.now()
-    ... }
+    >>> data = transform_data(extract_data(logger))
     >>> save_data_postgres(Session, data, logger)
     """
 
     session = Session()
     try:
-        novo_registro = DolarData(**data)
-        session.add(novo_registro)
-        session.commit()
+        with io_instrumentation():
+            session.execute(insert(DolarData), [data.row()])
+            notify_new_quotes(session, [data])
+            session.commit()
+        quote_broker.publish([data])
+        logger.info(
+            "[%s] Dados salvos com sucesso no banco de dados PostgreSQL.",
+            data.timestamp_criacao.strftime("%d/%m/%y %H:%M:%S"),
+        )
+        return True
+    except Exception as e:
+        logger.error("Erro ao salvar dados no PostgreSQL: %s", e)
+        session.rollback()
+        return False
+    finally:
+        session.close()
+
+
+def save_batch_postgres(Session, data_list, logger):
+    """Salva um lote de dados transformados no banco de dados PostgreSQL.
+
+    Todos os registros são inseridos em uma única transação, com um único `NOTIFY`
+    para o lote. Se ocorrer um erro, nenhum registro do lote é salvo.
+
+    Parameters
+    ----------
+    Session : sqlalchemy.orm.session.Session
+        Classe de sessão do SQLAlchemy para interagir com o banco.
+    data_list : list of Quote
+        Cotações transformadas, no formato aceito por `save_data_postgres`.
+    logger : logging.Logger
+        Logger para registrar logs do processo de salvamento.
+
+    Returns
+    -------
+    bool
+        True se o lote foi salvo, False se ocorreu um erro.
+    """
+    if not data_list:
+        return True
+    session = Session()
+    try:
+        with io_instrumentation():
+            session.execute(insert(DolarData), [data.row() for data in data_list])
+            notify_new_quotes(session, data_list)
+            session.commit()
+        quote_broker.publish(data_list)
+        logger.info(
+            "%d registros salvos com sucesso no banco de dados PostgreSQL.",
+            len(data_list),
+        )
+        return True
+    except Exception as e:
+        logger.error("Erro ao salvar lote no PostgreSQL: %s", e)
+        session.rollback()
+        return False
+    finally:
+        session.close()
+
+
+def save_missing_postgres(Session, data_list, logger):
+    """Salva apenas as cotações de um lote que ainda não existem no banco.
+
+    Uma cotação já existe se houver um registro do mesmo par com o mesmo
+    `timestamp_moeda`. Isso torna o backfill idempotente: reprocessar uma janela não
+    duplica registros.
+
+    Parameters
+    ----------
+    Session : sqlalchemy.orm.session.Session
+        Classe de sessão do SQLAlchemy para interagir com o banco.
+    data_list : list of Quote
+        Cotações transformadas de um mesmo par, no formato aceito por `save_data_postgres`.
+    logger : logging.Logger
+        Logger para registrar logs do processo de salvamento.
+
+    Returns
+    -------
+    list of Quote or None
+        Cotações efetivamente inseridas (vazia se nada foi inserido), ou None se ocorreu
+        um erro.
+    """
+    if not data_list:
+        return []
+    moeda_origem = data_list[0].moeda_origem
+    moeda_destino = data_list[0].moeda_destino
+    timestamps = [data.timestamp_moeda for data in data_list]
+    session = Session()
+    try:
+        with io_instrumentation():
+            existentes = {
+                row.timestamp_moeda
+                for row in session.query(DolarData.timestamp_moeda).filter(
+                    DolarData.moeda_origem == moeda_origem,
+                    DolarData.moeda_destino == moeda_destino,
+                    DolarData.timestamp_moeda.between(min(timestamps), max(timestamps)),
+                )
+            }
+        novos = []
+        for data in data_list:
+            if data.timestamp_moeda not in existentes:
+                existentes.add(data.timestamp_moeda)
+                novos.append(data)
+        if not novos:
+            return []
+        with io_instrumentation():
+            session.execute(insert(DolarData), [data.row() for data in novos])
+            notify_new_quotes(session, novos)
+            session.commit()
+        quote_broker.publish(novos)
         logger.info(
-            f"[{data['timestamp_criacao'].strftime('%d/%m/%y %H:%M:%S')}] "
-            f"Dados salvos com sucesso no banco de dados PostgreSQL."
+            "%d registros faltantes salvos no banco de dados PostgreSQL.", len(novos)
         )
+        return novos
     except Exception as e:
-        logger.error(f"Erro ao salvar dados no PostgreSQL: {e}")
+        logger.error("Erro ao salvar registros faltantes no PostgreSQL: %s", e)
         session.rollback()
+        return None
     finally:
         session.close()
@@ -0,0 +1,150 @@
+"""
+Módulo que define o registro tipado de uma cotação e a decodificação das respostas da API.
+
+Uma `Quote` é decodificada diretamente dos bytes da resposta da AwesomeAPI por um
+decodificador JSON com validação de schema (msgspec) e segue sem conversões pelas etapas
+de transformação e carga. Payloads malformados são rejeitados já na extração.
+"""
+
+import datetime
+from typing import Annotated
+
+import msgspec
+
+
+class QuoteDecodeError(ValueError):
+    """Erro levantado quando a resposta da API não contém cotações válidas."""
+
+
+# Código de moeda, com o mesmo limite da coluna String(3) de dolar_data
+CurrencyCode = Annotated[str, msgspec.Meta(min_length=1, max_length=3)]
+
+
+class Quote(msgspec.Struct, kw_only=True, gc=False):
+    """Cotação de um par de moedas.
+
+    Os campos `moeda_origem`, `moeda_destino`, `valor_de_compra` e `timestamp` são lidos
+    das chaves `code`, `codein`, `bid` e `timestamp` da API; os timestamps com timezone
+    são preenchidos na transformação.
+
+    Attributes
+    ----------
+    moeda_origem : str or None
+        Código da moeda de origem (ex: USD). Ausente em alguns itens do histórico.
+    moeda_destino : str or None
+        Código da moeda de destino (ex: BRL). Ausente em alguns itens do histórico.
+    valor_de_compra : float
+        Valor de compra da moeda de origem em relação à de destino.
+    timestamp : int
+        Timestamp Unix da cotação, como enviado pela API.
+    timestamp_moeda : datetime.datetime or None
+        Data e hora da cotação (timezone São Paulo).
+    timestamp_criacao : datetime.datetime or None
+        Data e hora de criação do registro (timezone São Paulo).
+    """
+
+    moeda_origem: CurrencyCode | None = msgspec.field(default=None, name="code")
+    moeda_destino: CurrencyCode | None = msgspec.field(default=None, name="codein")
+    valor_de_compra: Annotated[float, msgspec.Meta(gt=0)] = msgspec.field(name="bid")
+    timestamp: Annotated[int, msgspec.Meta(gt=0)]
+    timestamp_moeda: datetime.datetime | None = None
+    timestamp_criacao: datetime.datetime | None = None
+
+    def row(self):
+        """Retorna os valores das colunas da tabela dolar_data.
+
+        Returns
+        -------
+        dict
+            Dicionário com as colunas de `DolarData` (exceto `id`).
+        """
+        return {
+            "moeda_origem": self.moeda_origem,
+            "moeda_destino": self.moeda_destino,
+            "valor_de_compra": self.valor_de_compra,
+            "timestamp_moeda": self.timestamp_moeda,
+            "timestamp_criacao": self.timestamp_criacao,
+        }
+
+
+class LatestQuote(Quote, kw_only=True, gc=False):
+    """Cotação do endpoint de última cotação, em que `code` e `codein` são obrigatórios.
+
+    Só os itens do histórico após o primeiro podem omitir as moedas; na última cotação,
+    um payload sem elas é rejeitado na decodificação, e não na inserção.
+    """
+
+    moeda_origem: CurrencyCode = msgspec.field(name="code")
+    moeda_destino: CurrencyCode = msgspec.field(name="codein")
+
+
+# A API envia números como strings ("5.12"); strict=False permite a conversão
+_latest_decoder = msgspec.json.Decoder(dict[str, LatestQuote], strict=False)
+_list_decoder = msgspec.json.Decoder(list[Quote], strict=False)
+
+
+def decode_latest(content, par=None):
+    """Decodifica a resposta do endpoint de última cotação.
+
+    Parameters
+    ----------
+    content : bytes
+        Corpo da resposta, no formato ``{"USDBRL": {...}}``.
+    par : str, optional
+        Par de moedas pedido (ex: "USD-BRL"); se informado, a chave da resposta deve
+        corresponder a ele, by default None.
+
+    Returns
+    -------
+    LatestQuote
+        A cotação contida na resposta.
+
+    Raises
+    ------
+    QuoteDecodeError
+        Se o payload for malformado, não contiver exatamente uma cotação ou se a chave
+        não corresponder ao par pedido ou às moedas da cotação.
+    """
+    try:
+        quotes = _latest_decoder.decode(content)
+    except (msgspec.DecodeError, msgspec.ValidationError) as e:
+        raise QuoteDecodeError(str(e)) from e
+    if len(quotes) != 1:
+        raise QuoteDecodeError(
+            f"Esperada uma cotação, recebidas {len(quotes)}"
+        )
+    chave, quote = next(iter(quotes.items()))
+    esperada = quote.moeda_origem + quote.moeda_destino
+    if par is not None and par.replace("-", "") != esperada:
+        raise QuoteDecodeError(
+            f"Cotação de {esperada} recebida para o par {par}"
+        )
+    if chave != esperada:
+        raise QuoteDecodeError(
+            f"Chave {chave} não corresponde à cotação de {esperada}"
+        )
+    return quote
+
+
+def decode_list(content):
+    """Decodifica a resposta dos endpoints de histórico.
+
+    Parameters
+    ----------
+    content : bytes
+        Corpo da resposta, no formato ``[{...}, {...}]``.
+
+    Returns
+    -------
+    list of Quote
+        As cotações contidas na resposta.
+
+    Raises
+    ------
+    QuoteDecodeError
+        Se o payload for malformado.
+    """
+    try:
+        return _list_decoder.decode(content)
+    except (msgspec.DecodeError, msgspec.ValidationError) as e:
+        raise QuoteDecodeError(str(e)) from e
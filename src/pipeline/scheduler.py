@@ -0,0 +1,294 @@
+"""
+Módulo de agendamento das requisições à API de cotações.
+
+Todas as requisições à AwesomeAPI (polling ao vivo, carga histórica e backfill) passam
+por um único `RequestScheduler`, que:
+
+- limita a vazão com um token bucket dimensionado para a cota do plano do
+  `TOKEN_AWESOMEAPI`;
+- dá prioridade às cotações ao vivo sobre as janelas de backfill quando há fila;
+- abre um circuit breaker após respostas 429/5xx ou erros de rede consecutivos,
+  parando de bater em um endpoint com falha até o fim do período de espera.
+"""
+
+import heapq
+import itertools
+import threading
+import time
+
+import requests
+
+from src.config.config import (
+    CIRCUIT_FAILURE_THRESHOLD,
+    CIRCUIT_OPEN_SECONDS,
+    RATE_LIMIT_BURST,
+    RATE_LIMIT_PER_MINUTE,
+    io_instrumentation,
+)
+
+# Prioridades das requisições (menor valor é atendido primeiro)
+PRIORIDADE_AO_VIVO = 0
+PRIORIDADE_BACKFILL = 10
+
+
+class CircuitOpenError(Exception):
+    """Erro levantado quando o circuit breaker está aberto e a requisição é recusada."""
+
+
+class TokenBucket:
+    """Token bucket que limita a taxa média de requisições permitindo rajadas curtas.
+
+    Não é thread-safe por si só; o `RequestScheduler` o protege com seu lock.
+
+    Parameters
+    ----------
+    capacidade : float
+        Número máximo de tokens acumulados (tamanho da rajada).
+    taxa : float
+        Tokens repostos por segundo.
+    """
+
+    def __init__(self, capacidade, taxa):
+        self.capacidade = capacidade
+        self.taxa = taxa
+        self._tokens = capacidade
+        self._atualizado = time.monotonic()
+
+    def _refill(self):
+        agora = time.monotonic()
+        self._tokens = min(
+            self.capacidade, self._tokens + (agora - self._atualizado) * self.taxa
+        )
+        self._atualizado = agora
+
+    def wait_time(self):
+        """Retorna quantos segundos faltam para haver um token disponível.
+
+        Returns
+        -------
+        float
+            0 se já houver um token disponível.
+        """
+        self._refill()
+        if self._tokens >= 1:
+            return 0.0
+        return (1 - self._tokens) / self.taxa
+
+    def take(self):
+        """Consome um token (deve ser chamado após `wait_time` retornar 0)."""
+        self._tokens -= 1
+
+
+class CircuitBreaker:
+    """Circuit breaker com estados fechado, aberto e meio-aberto.
+
+    Após `limite_falhas` falhas consecutivas o circuito abre e recusa requisições por
+    `tempo_aberto` segundos (ou pelo `Retry-After` informado pela API). Depois disso,
+    uma única requisição de teste é liberada: se tiver sucesso o circuito fecha, se
+    falhar ele abre de novo.
+
+    Parameters
+    ----------
+    limite_falhas : int
+        Falhas consecutivas que abrem o circuito.
+    tempo_aberto : float
+        Segundos em que o circuito fica aberto.
+    """
+
+    def __init__(self, limite_falhas, tempo_aberto):
+        self.limite_falhas = limite_falhas
+        self.tempo_aberto = tempo_aberto
+        self._falhas = 0
+        self._aberto_ate = None
+        self._teste_em_andamento = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Indica se uma requisição pode ser feita agora.
+
+        Returns
+        -------
+        bool
+            True com o circuito fechado ou para a requisição de teste do estado
+            meio-aberto; False com o circuito aberto.
+        """
+        with self._lock:
+            if self._aberto_ate is None:
+                return True
+            if time.monotonic() < self._aberto_ate or self._teste_em_andamento:
+                return False
+            self._teste_em_andamento = True
+            return True
+
+    def retry_after(self):
+        """Retorna quantos segundos faltam para o circuito aceitar requisições.
+
+        Returns
+        -------
+        float
+            0 se o circuito estiver fechado ou pronto para a requisição de teste.
+        """
+        with self._lock:
+            if self._aberto_ate is None:
+                return 0.0
+            return max(self._aberto_ate - time.monotonic(), 0.0)
+
+    def record_success(self):
+        """Registra uma requisição bem-sucedida e fecha o circuito."""
+        with self._lock:
+            self._falhas = 0
+            self._aberto_ate = None
+            self._teste_em_andamento = False
+
+    def record_failure(self, retry_after=None):
+        """Registra uma falha (429, 5xx ou erro de rede).
+
+        Parameters
+        ----------
+        retry_after : float, optional
+            Tempo de espera pedido pela API (cabeçalho `Retry-After`), by default None.
+        """
+        with self._lock:
+            self._falhas += 1
+            if self._teste_em_andamento or self._falhas >= self.limite_falhas:
+                espera = max(self.tempo_aberto, retry_after or 0)
+                self._aberto_ate = time.monotonic() + espera
+            self._teste_em_andamento = False
+
+    @property
+    def is_open(self):
+        """bool: True se o circuito estiver aberto ou meio-aberto."""
+        with self._lock:
+            return self._aberto_ate is not None
+
+
+class RequestScheduler:
+    """Agenda as requisições HTTP respeitando cota, prioridade e circuit breaker.
+
+    Parameters
+    ----------
+    bucket : TokenBucket
+        Limitador de vazão compartilhado.
+    breaker : CircuitBreaker
+        Circuit breaker compartilhado.
+    """
+
+    def __init__(self, bucket, breaker):
+        self.bucket = bucket
+        self.breaker = breaker
+        self._fila = []
+        self._sequencia = itertools.count()
+        self._condition = threading.Condition()
+
+    def acquire(self, prioridade, timeout=None):
+        """Aguarda a vez de fazer uma requisição.
+
+        Requisições de menor prioridade numérica são atendidas antes; entre iguais, a
+        ordem de chegada é mantida.
+
+        Parameters
+        ----------
+        prioridade : int
+            Prioridade da requisição (ex: `PRIORIDADE_AO_VIVO`).
+        timeout : float, optional
+            Tempo máximo de espera em segundos, by default None (sem limite).
+
+        Raises
+        ------
+        CircuitOpenError
+            Se o circuit breaker estiver aberto.
+        TimeoutError
+            Se a vez não chegar dentro de `timeout`.
+        """
+        prazo = None if timeout is None else time.monotonic() + timeout
+        entrada = (prioridade, next(self._sequencia))
+        with self._condition:
+            heapq.heappush(self._fila, entrada)
+            try:
+                while True:
+                    if self.breaker.retry_after() > 0:
+                        raise CircuitOpenError(
+                            f"Circuito aberto; nova tentativa em "
+                            f"{self.breaker.retry_after():.0f}s"
+                        )
+                    espera = None
+                    if self._fila[0] == entrada:
+                        espera = self.bucket.wait_time()
+                        if espera == 0:
+                            # Só reserva a requisição de teste quando há token
+                            if not self.breaker.allow():
+                                raise CircuitOpenError(
+                                    "Circuito meio-aberto; requisição de teste em andamento"
+                                )
+                            self.bucket.take()
+                            return
+                    if prazo is not None:
+                        restante = prazo - time.monotonic()
+                        if restante <= 0:
+                            raise TimeoutError("Tempo esgotado aguardando a cota da API")
+                        espera = restante if espera is None else min(espera, restante)
+                    self._condition.wait(espera)
+            finally:
+                self._fila.remove(entrada)
+                heapq.heapify(self._fila)
+                self._condition.notify_all()
+
+    def get(self, url, prioridade, espera=None, **kwargs):
+        """Faz um GET agendado e registra o resultado no circuit breaker.
+
+        Parameters
+        ----------
+        url : str
+            URL da requisição.
+        prioridade : int
+            Prioridade da requisição (ex: `PRIORIDADE_BACKFILL`).
+        espera : float, optional
+            Tempo máximo de espera pela vez, by default None (sem limite).
+        **kwargs
+            Argumentos adicionais repassados para `requests.get` (ex: `timeout`).
+
+        Returns
+        -------
+        requests.Response
+            Resposta da requisição.
+
+        Raises
+        ------
+        CircuitOpenError
+            Se o circuit breaker estiver aberto.
+        TimeoutError
+            Se a vez não chegar dentro de `espera`.
+        requests.RequestException
+            Se a requisição falhar.
+        """
+        self.acquire(prioridade, espera)
+        try:
+            with io_instrumentation():
+                response = requests.get(url, **kwargs)
+        except requests.RequestException:
+            self.breaker.record_failure()
+            raise
+        if response.status_code == 429 or response.status_code >= 500:
+            retry_after = response.headers.get("Retry-After")
+            self.breaker.record_failure(
+                float(retry_after) if retry_after and retry_after.isdigit() else None
+            )
+        else:
+            self.breaker.record_success()
+        return response
+
+    def retry_after(self):
+        """Retorna quantos segundos faltam para o circuit breaker aceitar requisições.
+
+        Returns
+        -------
+        float
+            0 se o circuito estiver fechado.
+        """
+        return self.breaker.retry_after()
+
+
+request_scheduler = RequestScheduler(
+    TokenBucket(RATE_LIMIT_BURST, RATE_LIMIT_PER_MINUTE / 60),
+    CircuitBreaker(CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_OPEN_SECONDS),
+)
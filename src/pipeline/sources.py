@@ -0,0 +1,398 @@
+"""
+Módulo de fontes de cotação e extração com requisições "hedged".
+
+Uma fonte (`QuoteSource`) sabe buscar a última cotação de um par e mantém estatísticas
+da própria latência. O `HedgedExtractor` consulta primeiro a fonte mais rápida; se ela
+demorar mais que o percentil configurado da sua latência (ou falhar), dispara a próxima
+fonte em paralelo e usa a primeira resposta válida. Isso reduz a latência de cauda do
+ciclo e evita perder o tick quando uma fonte está fora do ar.
+"""
+
+import contextvars
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+
+from src.config.config import io_instrumentation
+from src.pipeline.quote import QuoteDecodeError, decode_latest
+from src.pipeline.scheduler import PRIORIDADE_AO_VIVO, CircuitOpenError
+
+AWESOMEAPI_URL = "https://economia.awesomeapi.com.br"
+
+
+class LatencyStats:
+    """Estatísticas de latência e falhas das últimas requisições de uma fonte.
+
+    A latência é registrada apenas para as requisições bem-sucedidas: falhas rápidas
+    (um 500 imediato, uma conexão recusada) puxariam o percentil para baixo e fariam
+    o hedge disparar cedo demais. As falhas entram só na taxa de falhas.
+
+    Parameters
+    ----------
+    window : int, optional
+        Número de requisições consideradas, by default 200.
+    """
+
+    def __init__(self, window=200):
+        self._latencias = deque(maxlen=window)
+        self._resultados = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, latencia, sucesso):
+        """Registra o resultado de uma requisição.
+
+        Parameters
+        ----------
+        latencia : float
+            Duração da requisição em segundos.
+        sucesso : bool
+            Se a requisição retornou uma cotação válida.
+        """
+        with self._lock:
+            if sucesso:
+                self._latencias.append(latencia)
+            self._resultados.append(sucesso)
+
+    def percentile(self, p):
+        """Retorna um percentil das latências das requisições bem-sucedidas.
+
+        Parameters
+        ----------
+        p : float
+            Percentil entre 0 e 100.
+
+        Returns
+        -------
+        float or None
+            Latência em segundos, ou None se não houver requisições bem-sucedidas
+            registradas.
+        """
+        with self._lock:
+            latencias = sorted(self._latencias)
+        if not latencias:
+            return None
+        indice = min(int(len(latencias) * p / 100), len(latencias) - 1)
+        return latencias[indice]
+
+    def failure_rate(self):
+        """Retorna a fração de requisições que falharam.
+
+        Returns
+        -------
+        float
+            Taxa de falhas entre 0 e 1 (0 se não houver requisições registradas).
+        """
+        with self._lock:
+            if not self._resultados:
+                return 0.0
+            return self._resultados.count(False) / len(self._resultados)
+
+    def score(self):
+        """Pontuação usada para ordenar as fontes (menor é melhor).
+
+        Combina a latência mediana com a taxa de falhas; fontes sem histórico recebem
+        pontuação zero, para que sejam experimentadas, e fontes que só falharam ficam
+        por último.
+
+        Returns
+        -------
+        float
+            Pontuação da fonte.
+        """
+        mediana = self.percentile(50)
+        if mediana is None:
+            return float("inf") if self.failure_rate() else 0.0
+        return mediana * (1 + 10 * self.failure_rate())
+
+    def snapshot(self):
+        """Retorna um resumo das estatísticas.
+
+        Returns
+        -------
+        dict
+            Dicionário com `p50`, `p95`, `p99` (segundos) e `taxa_de_falhas`.
+        """
+        return {
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+            "taxa_de_falhas": self.failure_rate(),
+        }
+
+
+class QuoteSource:
+    """Fonte de cotações. Subclasses implementam `_fetch`.
+
+    Parameters
+    ----------
+    name : str
+        Nome da fonte, usado nos logs.
+
+    Attributes
+    ----------
+    stats : LatencyStats
+        Estatísticas de latência e falhas da fonte.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.stats = LatencyStats()
+
+    def fetch(self, logger):
+        """Busca a última cotação, registrando latência e resultado.
+
+        Parameters
+        ----------
+        logger : logging.Logger
+            Logger para registrar logs do processo de extração.
+
+        Returns
+        -------
+        Quote or None
+            Cotação obtida, ou None se houver erro.
+        """
+        inicio = time.monotonic()
+        try:
+            quote = self._fetch(logger)
+        except (CircuitOpenError, TimeoutError) as e:
+            # Recusa do agendador: não reflete a latência da fonte
+            logger.warning("Requisição à fonte %s não enviada: %s", self.name, e)
+            return None
+        except (requests.RequestException, OSError, QuoteDecodeError) as e:
+            logger.error("Erro ao acessar a fonte %s: %s", self.name, e)
+            quote = None
+        self.stats.record(time.monotonic() - inicio, quote is not None)
+        return quote
+
+    def _fetch(self, logger):
+        raise NotImplementedError
+
+
+class AwesomeAPISource(QuoteSource):
+    """Fonte que consulta um endpoint compatível com a AwesomeAPI (`/json/last/<par>`).
+
+    Parameters
+    ----------
+    base_url : str, optional
+        URL base da API, by default `AWESOMEAPI_URL`.
+    token : str, optional
+        Token de acesso da API; se None, a URL não leva o parâmetro `token`, by default
+        None.
+    par : str, optional
+        Par de moedas consultado, by default "USD-BRL".
+    timeout : float, optional
+        Timeout da requisição em segundos, by default 10.
+    scheduler : RequestScheduler, optional
+        Agendador que controla a cota e o circuit breaker da API; se None, as
+        requisições são feitas diretamente, by default None.
+    """
+
+    def __init__(
+        self,
+        base_url=AWESOMEAPI_URL,
+        token=None,
+        par="USD-BRL",
+        timeout=10,
+        scheduler=None,
+    ):
+        super().__init__(base_url)
+        self.base_url = base_url.rstrip("/")
+        self.token = token
+        self.par = par
+        self.timeout = timeout
+        self.scheduler = scheduler
+
+    def _fetch(self, logger):
+        url = f"{self.base_url}/json/last/{self.par}"
+        if self.token:
+            url += f"?token={self.token}"
+        if self.scheduler is None:
+            with io_instrumentation():
+                response = requests.get(url, timeout=self.timeout)
+        else:
+            response = self.scheduler.get(
+                url, PRIORIDADE_AO_VIVO, espera=self.timeout, timeout=self.timeout
+            )
+        if response.status_code != 200:
+            logger.error(
+                "Erro ao acessar a API %s: %s - %s",
+                self.name,
+                response.status_code,
+                response.text,
+            )
+            return None
+        return decode_latest(response.content, self.par)
+
+
+class LocalSource(QuoteSource):
+    """Fonte local que lê uma resposta no formato da AwesomeAPI de um arquivo.
+
+    Serve como substituta das APIs externas em testes e desenvolvimento local.
+
+    Parameters
+    ----------
+    path : str
+        Caminho do arquivo JSON (ex: ``{"USDBRL": {"bid": "5.12", ...}}``).
+    delay : float, optional
+        Atraso artificial em segundos, útil para simular uma fonte lenta, by default 0.
+    par : str, optional
+        Par de moedas esperado no arquivo, by default "USD-BRL".
+    """
+
+    def __init__(self, path, delay=0.0, par="USD-BRL"):
+        super().__init__(f"local:{path}")
+        self.path = path
+        self.delay = delay
+        self.par = par
+
+    def _fetch(self, logger):
+        if self.delay:
+            time.sleep(self.delay)
+        with open(self.path, "rb") as f:
+            return decode_latest(f.read(), self.par)
+
+
+def build_sources(specs, token=None, scheduler=None, source_tokens=None):
+    """Cria as fontes de cotação a partir de uma lista de especificações.
+
+    Parameters
+    ----------
+    specs : list of str
+        Cada item pode ser ``awesomeapi``, a URL base de uma API compatível com a
+        AwesomeAPI ou ``local:<caminho>`` para uma `LocalSource`.
+    token : str, optional
+        Token da AwesomeAPI, usado apenas pela fonte ``awesomeapi``, by default None.
+    scheduler : RequestScheduler, optional
+        Agendador da cota do `token`, usado apenas pela fonte ``awesomeapi``, by default
+        None.
+    source_tokens : dict, optional
+        Mapeamento URL -> token das fontes configuradas por URL. Essas fontes são outros
+        provedores, com credenciais e limites próprios: nunca recebem o `token` da
+        AwesomeAPI nem passam pelo `scheduler`, by default None.
+
+    Returns
+    -------
+    list of QuoteSource
+        Fontes configuradas, na ordem informada.
+
+    Raises
+    ------
+    ValueError
+        Se uma especificação não for reconhecida.
+    """
+    sources = []
+    for spec in specs:
+        spec = spec.strip()
+        if not spec:
+            continue
+        if spec == "awesomeapi":
+            sources.append(AwesomeAPISource(token=token, scheduler=scheduler))
+        elif spec.startswith("local:"):
+            sources.append(LocalSource(spec.removeprefix("local:")))
+        elif spec.startswith(("http://", "https://")):
+            sources.append(
+                AwesomeAPISource(spec, token=(source_tokens or {}).get(spec))
+            )
+        else:
+            raise ValueError(f"Fonte de cotação desconhecida: {spec}")
+    return sources
+
+
+class HedgedExtractor:
+    """Consulta várias fontes de cotação com requisições "hedged".
+
+    A cada chamada, as fontes são ordenadas por `LatencyStats.score`. A primeira fonte é
+    consultada; se não responder dentro do percentil `hedge_percentile` da sua latência,
+    ou se falhar, a próxima fonte é disparada em paralelo. A primeira cotação válida é
+    retornada; as requisições perdedoras terminam em background e continuam alimentando
+    as estatísticas. Com uma única fonte, o hedge é uma segunda requisição à mesma fonte.
+
+    Parameters
+    ----------
+    sources : list of QuoteSource
+        Fontes de cotação.
+    hedge_percentile : float, optional
+        Percentil da latência da fonte após o qual a próxima é disparada, by default 95.
+    default_hedge_delay : float, optional
+        Atraso do hedge em segundos enquanto a fonte não tem histórico, by default 2.
+    timeout : float, optional
+        Tempo máximo de espera por uma cotação válida, by default 15.
+    """
+
+    def __init__(
+        self, sources, hedge_percentile=95, default_hedge_delay=2.0, timeout=15.0
+    ):
+        if not sources:
+            raise ValueError("Nenhuma fonte de cotação configurada")
+        self.sources = list(sources)
+        self.hedge_percentile = hedge_percentile
+        self.default_hedge_delay = default_hedge_delay
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(
+            max_workers=2 * len(self.sources) + 2,
+            thread_name_prefix="quote-source",
+        )
+
+    def fetch(self, logger):
+        """Busca a última cotação na primeira fonte que responder com dados válidos.
+
+        Parameters
+        ----------
+        logger : logging.Logger
+            Logger para registrar logs do processo de extração.
+
+        Returns
+        -------
+        Quote or None
+            Cotação obtida, ou None se nenhuma fonte respondeu a tempo.
+        """
+        candidatas = sorted(self.sources, key=lambda source: source.stats.score())
+        if len(candidatas) == 1:
+            candidatas = candidatas * 2
+        prazo = time.monotonic() + self.timeout
+        pendentes = {}
+
+        def disparar():
+            source = candidatas.pop(0)
+            # Copia o contexto para a thread herdar o span e a amostragem do ciclo
+            contexto = contextvars.copy_context()
+            pendentes[self._executor.submit(contexto.run, source.fetch, logger)] = source
+            return source
+
+        atual = disparar()
+        while pendentes:
+            restante = prazo - time.monotonic()
+            if restante <= 0:
+                break
+            espera = restante
+            if candidatas:
+                atraso = atual.stats.percentile(self.hedge_percentile)
+                espera = min(restante, atraso or self.default_hedge_delay)
+            concluidas, _ = wait(pendentes, timeout=espera, return_when=FIRST_COMPLETED)
+            for future in concluidas:
+                pendentes.pop(future)
+                quote = future.result()
+                if quote is not None:
+                    return quote
+            if candidatas:
+                # Hedge por lentidão ou failover imediato após uma falha
+                if not concluidas:
+                    logger.info(
+                        "Fonte %s lenta; disparando requisição hedge.", atual.name
+                    )
+                atual = disparar()
+        logger.error("Nenhuma fonte de cotação retornou dados válidos.")
+        return None
+
+    def stats(self):
+        """Retorna as estatísticas de latência de cada fonte.
+
+        Returns
+        -------
+        dict
+            Mapeamento nome da fonte -> `LatencyStats.snapshot`.
+        """
+        return {source.name: source.stats.snapshot() for source in self.sources}
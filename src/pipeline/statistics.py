@@ -0,0 +1,573 @@
+"""
+Módulo de estatísticas incrementais em janelas deslizantes para as cotações.
+
+Mantém, por par de moedas e por janela (última hora, dia, semana, mês, dia corrente e todo
+o histórico), o último valor, máximo, mínimo, média e desvio padrão. As atualizações são
+feitas tick a tick pelo pipeline em tempo O(1) amortizado: máximo e mínimo usam deques
+monotônicos e média/variância usam o algoritmo de Welford com remoção. Assim, o dashboard
+e a API leem as estatísticas de um período sem percorrer a tabela inteira.
+"""
+
+import datetime
+import math
+import threading
+from collections import deque
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import func
+
+from src.database.database import DolarBar, DolarData
+
+TZ_SAO_PAULO = ZoneInfo("America/Sao_Paulo")
+
+# Marcador da janela do dia corrente (desde 00:00 no horário de São Paulo)
+HOJE = "hoje"
+
+JANELAS_PADRAO = {
+    "hora": datetime.timedelta(hours=1),
+    "dia": datetime.timedelta(days=1),
+    "semana": datetime.timedelta(weeks=1),
+    "mes": datetime.timedelta(days=30),
+    "hoje": HOJE,
+    "todos": None,
+}
+
+
+def to_sao_paulo(timestamp):
+    """Converte um timestamp para o fuso de São Paulo.
+
+    Timestamps sem timezone são interpretados como horário de São Paulo.
+
+    Parameters
+    ----------
+    timestamp : datetime.datetime
+        Timestamp a ser convertido.
+
+    Returns
+    -------
+    datetime.datetime
+        Timestamp com timezone America/Sao_Paulo.
+    """
+    if timestamp.tzinfo is None:
+        return timestamp.replace(tzinfo=TZ_SAO_PAULO)
+    return timestamp.astimezone(TZ_SAO_PAULO)
+
+
+def window_start(duracao, agora):
+    """Calcula o início de uma janela em relação ao instante atual.
+
+    Parameters
+    ----------
+    duracao : datetime.timedelta, str or None
+        Duração da janela, `HOJE` para o dia corrente ou None para janela ilimitada.
+    agora : datetime.datetime
+        Instante de referência (com timezone).
+
+    Returns
+    -------
+    datetime.datetime or None
+        Início da janela, ou None se a janela for ilimitada.
+    """
+    if duracao is None:
+        return None
+    if duracao == HOJE:
+        return agora.replace(hour=0, minute=0, second=0, microsecond=0)
+    return agora - duracao
+
+
+class RollingWindow:
+    """Estatísticas incrementais de uma única janela deslizante.
+
+    Os valores devem ser adicionados em ordem crescente de timestamp. Janelas limitadas
+    guardam os ticks em uma deque para poder removê-los quando saem da janela; a janela
+    ilimitada guarda apenas os agregados.
+
+    Attributes
+    ----------
+    duracao : datetime.timedelta, str or None
+        Duração da janela, `HOJE` ou None para janela ilimitada.
+    quantidade : int
+        Número de ticks dentro da janela.
+    ultimo : float or None
+        Valor mais recente dentro da janela.
+    """
+
+    def __init__(self, duracao):
+        self.duracao = duracao
+        self.quantidade = 0
+        self.ultimo = None
+        self._media = 0.0
+        self._m2 = 0.0
+        # Janela limitada: (timestamp, valor) de todos os ticks e deques monotônicos
+        self._valores = deque()
+        self._maximos = deque()
+        self._minimos = deque()
+        # Janela ilimitada: extremos acumulados
+        self._maximo = None
+        self._minimo = None
+
+    def add(self, timestamp, valor):
+        """Adiciona um tick à janela.
+
+        Parameters
+        ----------
+        timestamp : datetime.datetime
+            Timestamp da cotação (com timezone).
+        valor : float
+            Valor da cotação.
+        """
+        self.ultimo = valor
+        self._welford_add(valor)
+        if self.duracao is None:
+            self._maximo = valor if self._maximo is None else max(self._maximo, valor)
+            self._minimo = valor if self._minimo is None else min(self._minimo, valor)
+            return
+        self._valores.append((timestamp, valor))
+        while self._maximos and self._maximos[-1][1] <= valor:
+            self._maximos.pop()
+        self._maximos.append((timestamp, valor))
+        while self._minimos and self._minimos[-1][1] >= valor:
+            self._minimos.pop()
+        self._minimos.append((timestamp, valor))
+
+    def evict(self, agora):
+        """Remove os ticks que ficaram fora da janela.
+
+        Parameters
+        ----------
+        agora : datetime.datetime
+            Instante de referência (com timezone).
+        """
+        inicio = window_start(self.duracao, agora)
+        if inicio is None:
+            return
+        while self._valores and self._valores[0][0] < inicio:
+            _, valor = self._valores.popleft()
+            self._welford_remove(valor)
+        while self._maximos and self._maximos[0][0] < inicio:
+            self._maximos.popleft()
+        while self._minimos and self._minimos[0][0] < inicio:
+            self._minimos.popleft()
+        if not self._valores:
+            self.ultimo = None
+
+    def load_aggregate(self, quantidade, media, variancia, minimo, maximo, ultimo):
+        """Inicializa uma janela ilimitada a partir de agregados já calculados.
+
+        Parameters
+        ----------
+        quantidade : int
+            Número de ticks agregados.
+        media : float
+            Média dos valores.
+        variancia : float
+            Variância populacional dos valores.
+        minimo : float
+            Menor valor.
+        maximo : float
+            Maior valor.
+        ultimo : float
+            Valor mais recente.
+        """
+        if self.duracao is not None or not quantidade:
+            return
+        self.quantidade = quantidade
+        self._media = media
+        self._m2 = variancia * quantidade
+        self._minimo = minimo
+        self._maximo = maximo
+        self.ultimo = ultimo
+
+    def snapshot(self):
+        """Retorna as estatísticas atuais da janela.
+
+        Returns
+        -------
+        dict or None
+            Dicionário com as chaves `atual`, `maximo`, `minimo`, `media`,
+            `desvio_padrao` e `quantidade`, ou None se a janela estiver vazia.
+        """
+        if self.quantidade == 0:
+            return None
+        if self.duracao is None:
+            maximo, minimo = self._maximo, self._minimo
+        else:
+            maximo, minimo = self._maximos[0][1], self._minimos[0][1]
+        variancia = self._m2 / self.quantidade if self.quantidade > 1 else 0.0
+        return {
+            "atual": self.ultimo,
+            "maximo": maximo,
+            "minimo": minimo,
+            "media": self._media,
+            "desvio_padrao": math.sqrt(max(variancia, 0.0)),
+            "quantidade": self.quantidade,
+        }
+
+    def _welford_add(self, valor):
+        self.quantidade += 1
+        delta = valor - self._media
+        self._media += delta / self.quantidade
+        self._m2 += delta * (valor - self._media)
+
+    def _welford_remove(self, valor):
+        if self.quantidade <= 1:
+            self.quantidade = 0
+            self._media = 0.0
+            self._m2 = 0.0
+            return
+        self.quantidade -= 1
+        delta = valor - self._media
+        self._media -= delta / self.quantidade
+        self._m2 = max(self._m2 - delta * (valor - self._media), 0.0)
+
+
+class RollingStatistics:
+    """Estatísticas em janelas deslizantes para todos os pares de moedas.
+
+    É seguro compartilhar uma instância entre a thread do pipeline (que chama `update`)
+    e as threads que atendem requisições (que chamam `get`). Ticks com timestamp igual ou
+    anterior ao último tick do par são ignorados, o que descarta as repetições da mesma
+    cotação entre duas consultas à API.
+
+    Parameters
+    ----------
+    janelas : dict, optional
+        Mapeamento nome -> duração (`datetime.timedelta`, `HOJE` ou None para todo o
+        histórico), by default `JANELAS_PADRAO`.
+    """
+
+    def __init__(self, janelas=None):
+        self.janelas = dict(JANELAS_PADRAO if janelas is None else janelas)
+        self._pares = {}
+        self._ultimo_timestamp = {}
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    def update(self, moeda_origem, moeda_destino, valor, timestamp):
+        """Alimenta as janelas de um par com um novo tick.
+
+        Parameters
+        ----------
+        moeda_origem : str
+            Código da moeda de origem (ex: USD).
+        moeda_destino : str
+            Código da moeda de destino (ex: BRL).
+        valor : float
+            Valor de compra da cotação.
+        timestamp : datetime.datetime
+            Timestamp da cotação.
+
+        Returns
+        -------
+        bool
+            True se o tick foi incorporado, False se era repetido ou fora de ordem.
+        """
+        par = (moeda_origem, moeda_destino)
+        timestamp = to_sao_paulo(timestamp)
+        valor = float(valor)
+        with self._lock:
+            ultimo = self._ultimo_timestamp.get(par)
+            if ultimo is not None and timestamp <= ultimo:
+                return False
+            self._ultimo_timestamp[par] = timestamp
+            janelas = self._windows_for(par)
+            for janela in janelas.values():
+                janela.add(timestamp, valor)
+                janela.evict(timestamp)
+        return True
+
+    def get(self, moeda_origem, moeda_destino, janela, agora=None):
+        """Retorna as estatísticas de um par em uma janela.
+
+        Parameters
+        ----------
+        moeda_origem : str
+            Código da moeda de origem (ex: USD).
+        moeda_destino : str
+            Código da moeda de destino (ex: BRL).
+        janela : str
+            Nome da janela (ex: "hora", "dia", "hoje", "todos").
+        agora : datetime.datetime, optional
+            Instante de referência, by default o horário atual de São Paulo.
+
+        Returns
+        -------
+        dict or None
+            Estatísticas da janela (ver `RollingWindow.snapshot`), ou None se não
+            houver dados no período.
+
+        Raises
+        ------
+        KeyError
+            Se a janela não estiver configurada.
+        """
+        if janela not in self.janelas:
+            raise KeyError(janela)
+        agora = to_sao_paulo(agora) if agora else datetime.datetime.now(TZ_SAO_PAULO)
+        with self._lock:
+            janelas = self._pares.get((moeda_origem, moeda_destino))
+            if janelas is None:
+                return None
+            janelas[janela].evict(agora)
+            return janelas[janela].snapshot()
+
+    def get_all(self, moeda_origem, moeda_destino, agora=None):
+        """Retorna as estatísticas de um par em todas as janelas configuradas.
+
+        Parameters
+        ----------
+        moeda_origem : str
+            Código da moeda de origem (ex: USD).
+        moeda_destino : str
+            Código da moeda de destino (ex: BRL).
+        agora : datetime.datetime, optional
+            Instante de referência, by default o horário atual de São Paulo.
+
+        Returns
+        -------
+        dict
+            Mapeamento nome da janela -> estatísticas (ou None).
+        """
+        return {
+            janela: self.get(moeda_origem, moeda_destino, janela, agora)
+            for janela in self.janelas
+        }
+
+    def pairs(self):
+        """Lista os pares de moedas conhecidos.
+
+        Returns
+        -------
+        list of tuple
+            Pares (moeda_origem, moeda_destino).
+        """
+        with self._lock:
+            return list(self._pares)
+
+    def rebuild_from_db(self, Session):
+        """Reconstrói o estado de todas as janelas a partir do banco de dados.
+
+        Os ticks dentro da maior janela limitada são reprocessados em ordem; os mais
+        antigos e as barras compactadas (dolar_data_barras) entram apenas nas janelas
+        ilimitadas, via agregação no PostgreSQL.
+
+        Parameters
+        ----------
+        Session : sqlalchemy.orm.session.Session
+            Classe de sessão do SQLAlchemy para interagir com o banco.
+        """
+        agora = datetime.datetime.now(TZ_SAO_PAULO)
+        inicio = self._oldest_start(agora)
+        with self._refresh_lock:
+            session = Session()
+            try:
+                with self._lock:
+                    self._pares = {}
+                    self._ultimo_timestamp = {}
+                if any(duracao is None for duracao in self.janelas.values()):
+                    self._load_history_aggregates(session, inicio)
+                self._feed_rows(session, inicio)
+            finally:
+                session.close()
+
+    def refresh_from_db(self, Session, desde=None):
+        """Alimenta as janelas com os ticks gravados após o último tick conhecido.
+
+        Útil para processos que não recebem os ticks diretamente do pipeline, como
+        o dashboard. Ticks anteriores ao último conhecido (por exemplo, os inseridos
+        pelo backfill) não podem ser incorporados incrementalmente; se `desde` indicar
+        que há ticks assim, o estado é reconstruído com `rebuild_from_db`.
+
+        Parameters
+        ----------
+        Session : sqlalchemy.orm.session.Session
+            Classe de sessão do SQLAlchemy para interagir com o banco.
+        desde : datetime.datetime, optional
+            Menor timestamp dos ticks gravados desde a última atualização, by default
+            None (apenas ticks novos).
+        """
+        if desde is not None:
+            with self._lock:
+                ultimo = max(self._ultimo_timestamp.values(), default=None)
+            if ultimo is not None and to_sao_paulo(desde) <= ultimo:
+                self.rebuild_from_db(Session)
+                return
+        with self._refresh_lock:
+            with self._lock:
+                ultimo = max(self._ultimo_timestamp.values(), default=None)
+            session = Session()
+            try:
+                self._feed_rows(session, ultimo, inclusive=False)
+            finally:
+                session.close()
+
+    def _windows_for(self, par):
+        janelas = self._pares.get(par)
+        if janelas is None:
+            janelas = {
+                nome: RollingWindow(duracao) for nome, duracao in self.janelas.items()
+            }
+            self._pares[par] = janelas
+        return janelas
+
+    def _oldest_start(self, agora):
+        inicios = [
+            window_start(duracao, agora)
+            for duracao in self.janelas.values()
+            if duracao is not None
+        ]
+        return min(inicios, default=agora)
+
+    def _feed_rows(self, session, inicio, inclusive=True):
+        query = session.query(
+            DolarData.moeda_origem,
+            DolarData.moeda_destino,
+            DolarData.valor_de_compra,
+            DolarData.timestamp_moeda,
+        )
+        if inicio is not None:
+            if inclusive:
+                query = query.filter(DolarData.timestamp_moeda >= inicio)
+            else:
+                query = query.filter(DolarData.timestamp_moeda > inicio)
+        # Entre repetições do mesmo timestamp, `update` mantém a primeira gravada
+        for row in query.order_by(DolarData.timestamp_moeda, DolarData.id).yield_per(
+            1000
+        ):
+            self.update(
+                row.moeda_origem,
+                row.moeda_destino,
+                row.valor_de_compra,
+                row.timestamp_moeda,
+            )
+
+    def _load_history_aggregates(self, session, inicio):
+        # Ticks anteriores a `inicio` (e as barras compactadas) só contribuem para as
+        # janelas ilimitadas. Cada fonte é resumida em (n, soma, soma dos quadrados,
+        # mínimo, máximo, último timestamp, último valor) e as fontes são combinadas.
+        # Como em `update`, cada timestamp de um par conta uma vez (a primeira gravação),
+        # para que a reconstrução dê o mesmo resultado das atualizações incrementais.
+        resumos = {}
+        ticks = (
+            session.query(
+                DolarData.moeda_origem,
+                DolarData.moeda_destino,
+                DolarData.valor_de_compra,
+                DolarData.timestamp_moeda,
+            )
+            .filter(DolarData.timestamp_moeda < inicio)
+            .distinct(
+                DolarData.moeda_origem,
+                DolarData.moeda_destino,
+                DolarData.timestamp_moeda,
+            )
+            .order_by(
+                DolarData.moeda_origem,
+                DolarData.moeda_destino,
+                DolarData.timestamp_moeda,
+                DolarData.id,
+            )
+            .subquery()
+        )
+        rows = (
+            session.query(
+                ticks.c.moeda_origem,
+                ticks.c.moeda_destino,
+                func.count(),
+                func.avg(ticks.c.valor_de_compra),
+                func.var_pop(ticks.c.valor_de_compra),
+                func.min(ticks.c.valor_de_compra),
+                func.max(ticks.c.valor_de_compra),
+                func.max(ticks.c.timestamp_moeda),
+            )
+            .group_by(ticks.c.moeda_origem, ticks.c.moeda_destino)
+            .all()
+        )
+        for origem, destino, quantidade, media, variancia, minimo, maximo, ts in rows:
+            ultimo = (
+                session.query(DolarData.valor_de_compra)
+                .filter(
+                    DolarData.moeda_origem == origem,
+                    DolarData.moeda_destino == destino,
+                    DolarData.timestamp_moeda == ts,
+                )
+                .order_by(DolarData.id)
+                .limit(1)
+                .scalar()
+            )
+            media, variancia = float(media), float(variancia or 0.0)
+            self._merge_summary(
+                resumos,
+                (origem, destino),
+                (
+                    quantidade,
+                    quantidade * media,
+                    quantidade * (variancia + media * media),
+                    minimo,
+                    maximo,
+                    ts,
+                    ultimo,
+                ),
+            )
+        barras = (
+            session.query(
+                DolarBar.moeda_origem,
+                DolarBar.moeda_destino,
+                func.sum(DolarBar.quantidade),
+                func.sum(DolarBar.quantidade * DolarBar.media),
+                func.sum(
+                    DolarBar.quantidade
+                    * (DolarBar.variancia + DolarBar.media * DolarBar.media)
+                ),
+                func.min(DolarBar.minima),
+                func.max(DolarBar.maxima),
+                func.max(DolarBar.inicio),
+            )
+            .filter(DolarBar.inicio < inicio)
+            .group_by(DolarBar.moeda_origem, DolarBar.moeda_destino)
+            .all()
+        )
+        for origem, destino, quantidade, soma, soma_q, minimo, maximo, ts in barras:
+            ultimo = (
+                session.query(DolarBar.fechamento)
+                .filter(
+                    DolarBar.moeda_origem == origem,
+                    DolarBar.moeda_destino == destino,
+                    DolarBar.inicio == ts,
+                )
+                .limit(1)
+                .scalar()
+            )
+            self._merge_summary(
+                resumos,
+                (origem, destino),
+                (quantidade, soma, soma_q, minimo, maximo, ts, ultimo),
+            )
+        for par, (quantidade, soma, soma_q, minimo, maximo, _, ultimo) in resumos.items():
+            media = soma / quantidade
+            variancia = max(soma_q / quantidade - media * media, 0.0)
+            with self._lock:
+                janelas = self._windows_for(par)
+                for janela in janelas.values():
+                    janela.load_aggregate(
+                        quantidade, media, variancia, minimo, maximo, ultimo
+                    )
+
+    @staticmethod
+    def _merge_summary(resumos, par, resumo):
+        atual = resumos.get(par)
+        if atual is None:
+            resumos[par] = resumo
+            return
+        quantidade, soma, soma_q, minimo, maximo, ts, ultimo = atual
+        if resumo[5] > ts:
+            ts, ultimo = resumo[5], resumo[6]
+        resumos[par] = (
+            quantidade + resumo[0],
+            soma + resumo[1],
+            soma_q + resumo[2],
+            min(minimo, resumo[3]),
+            max(maximo, resumo[4]),
+            ts,
+            ultimo,
+        )
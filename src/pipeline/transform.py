@@ -2,106 +2,80 @@
 Módulo responsável pela transformação dos dados extraídos da cotação do dólar (USD-BRL).
 
 Este módulo processa os dados brutos recebidos da API e os converte para o formato
-padronizado usado internamente pelo sistema.
+padronizado usado internamente pelo sistema. As cotações são registros `Quote`
+preenchidos no próprio objeto, sem cópias intermediárias.
 """
 
 from datetime import UTC, datetime
 from zoneinfo import ZoneInfo
 
+TZ_SAO_PAULO = ZoneInfo("America/Sao_Paulo")
+
 
 def transform_data(data):
-    """Transforma os dados extraídos da API para o formato padronizado.
+    """Transforma a cotação extraída da API para o formato padronizado.
 
-    Extrai informações relevantes dos dados brutos da API e as converte para
-    o formato interno do sistema, incluindo conversão de timezone.
+    Preenche os timestamps da cotação, incluindo conversão de timezone.
 
     Parameters
     ----------
-    data : dict
-        Dicionário contendo os dados extraídos da API com a chave "USDBRL".
+    data : Quote
+        Cotação decodificada da resposta da API.
 
     Returns
     -------
-    dict
-        Dicionário com os dados transformados contendo:
-        - moeda_origem: Código da moeda de origem (USD)
-        - moeda_destino: Código da moeda de destino (BRL)
-        - valor_de_compra: Valor de compra do dólar em relação ao real
+    Quote
+        A mesma cotação, com:
         - timestamp_moeda: Timestamp da cotação (timezone São Paulo)
         - timestamp_criacao: Timestamp de criação (timezone São Paulo)
 
     Examples
     --------
-    >>> raw_data = {"USDBRL": {"code": "USD", "codein": "BRL", "bid": "5.12", "timestamp": "1640995200"}}
-    >>> transformed = transform_data(raw_data)
-    >>> print(transformed["valor_de_compra"])
+    >>> quote = decode_latest(b'{"USDBRL": {"code": "USD", "codein": "BRL", "bid": "5.12", "timestamp": "1640995200"}}')
+    >>> transformed = transform_data(quote)
+    >>> print(transformed.valor_de_compra)
     5.12
     """
-    moeda_origem = data["USDBRL"]["code"]
-    moeda_destino = data["USDBRL"]["codein"]
-    valor_de_compra = data["USDBRL"]["bid"]
-    timestamp_moeda = datetime.fromtimestamp(
-        int(data["USDBRL"]["timestamp"]), tz=UTC
-    ).astimezone(ZoneInfo("America/Sao_Paulo"))
-    timestamp_criacao = datetime.now(UTC).astimezone(ZoneInfo("America/Sao_Paulo"))
-
-    data_transformed = {
-        "moeda_origem": moeda_origem,
-        "moeda_destino": moeda_destino,
-        "valor_de_compra": valor_de_compra,
-        "timestamp_moeda": timestamp_moeda,
-        "timestamp_criacao": timestamp_criacao,
-    }
-
-    return data_transformed
+    data.timestamp_moeda = datetime.fromtimestamp(data.timestamp, tz=TZ_SAO_PAULO)
+    data.timestamp_criacao = datetime.now(UTC).astimezone(TZ_SAO_PAULO)
+    return data
 
 
 def transform_historical_data(data_list):
     """
-    Transforma uma lista de dados históricos extraídos da API para o formato padronizado.
+    Transforma uma lista de cotações históricas extraídas da API para o formato padronizado.
 
     Parameters
     ----------
-    data_list : list
-        Lista de dicionários contendo dados históricos extraídos da API,
-        onde cada dicionário representa uma cotação do dólar.
+    data_list : list of Quote
+        Lista de cotações decodificadas da resposta da API.
 
     Returns
     -------
-    list
-        Lista de dicionários com os dados transformados, cada um contendo:
-        - moeda_origem: Código da moeda de origem (USD)
-        - moeda_destino: Código da moeda de destino (BRL)
-        - valor_de_compra: Valor de compra do dólar em relação ao real
+    list of Quote
+        As mesmas cotações, com moedas preenchidas (os itens do histórico após o primeiro
+        podem não trazer `code`/`codein`) e com:
         - timestamp_moeda: Timestamp da cotação (timezone São Paulo)
         - timestamp_criacao: Timestamp de criação (timezone São Paulo)
     Examples
     --------
-    >>> historical_data = [
-    ...     {"code": "USD", "codein": "BRL", "bid": "5.12", "timestamp": "1640995200"},
-    ...     {"code": "USD", "codein": "BRL", "bid": "5.15", "timestamp": "1641081600"}
-    ... ]
+    >>> historical_data = decode_list(
+    ...     b'[{"code": "USD", "codein": "BRL", "bid": "5.12", "timestamp": "1640995200"},'
+    ...     b' {"bid": "5.15", "timestamp": "1641081600"}]'
+    ... )
+    >>> transformed = transform_historical_data(historical_data)
     """
-    from datetime import UTC, datetime
-    from zoneinfo import ZoneInfo
-
-    transformed = []
+    if not data_list:
+        return data_list
     # Pega code e codein do primeiro item (sempre tem)
-    moeda_origem = data_list[0].get("code", "USD")
-    moeda_destino = data_list[0].get("codein", "BRL")
+    moeda_origem = data_list[0].moeda_origem or "USD"
+    moeda_destino = data_list[0].moeda_destino or "BRL"
+    timestamp_criacao = datetime.now(UTC).astimezone(TZ_SAO_PAULO)
     for data in data_list:
-        valor_de_compra = data["bid"]
-        timestamp_moeda = datetime.fromtimestamp(
-            int(data["timestamp"]), tz=UTC
-        ).astimezone(ZoneInfo("America/Sao_Paulo"))
-        timestamp_criacao = datetime.now(UTC).astimezone(ZoneInfo("America/Sao_Paulo"))
-        transformed.append(
-            {
-                "moeda_origem": data.get("code", moeda_origem),
-                "moeda_destino": data.get("codein", moeda_destino),
-                "valor_de_compra": valor_de_compra,
-                "timestamp_moeda": timestamp_moeda,
-                "timestamp_criacao": timestamp_criacao,
-            }
-        )
-    return transformed
+        if data.moeda_origem is None:
+            data.moeda_origem = moeda_origem
+        if data.moeda_destino is None:
+            data.moeda_destino = moeda_destino
+        data.timestamp_moeda = datetime.fromtimestamp(data.timestamp, tz=TZ_SAO_PAULO)
+        data.timestamp_criacao = timestamp_criacao
+    return data_list